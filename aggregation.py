@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Dict, Type
+
+import numpy as np
+
+
+class ScoreAggregator(ABC):
+    """
+    Reduces candidate-vs-corpus similarity blocks of shape `(candidates, block)` into one score per candidate.
+
+    `update` is called once per corpus block, so only the current block has to be in memory.
+    """
+
+    def __init__(self, num_candidates: int, top_k: int = 5, temperature: float = 0.05) -> None:
+        self.num_candidates = num_candidates
+        self.top_k = max(1, int(top_k))
+        self.temperature = max(float(temperature), 1e-6)
+
+    @abstractmethod
+    def update(self, block: np.ndarray) -> None:
+        ...
+
+    @abstractmethod
+    def result(self) -> np.ndarray:
+        ...
+
+
+class MeanAggregator(ScoreAggregator):
+    def __init__(self, num_candidates: int, **kwargs) -> None:
+        super().__init__(num_candidates, **kwargs)
+        self._sum = np.zeros(num_candidates, dtype=np.float64)
+        self._count = 0
+
+    def update(self, block: np.ndarray) -> None:
+        self._sum += block.sum(axis=1)
+        self._count += block.shape[1]
+
+    def result(self) -> np.ndarray:
+        return self._sum / max(self._count, 1)
+
+
+class MaxAggregator(ScoreAggregator):
+    def __init__(self, num_candidates: int, **kwargs) -> None:
+        super().__init__(num_candidates, **kwargs)
+        self._max = np.full(num_candidates, -np.inf, dtype=np.float64)
+
+    def update(self, block: np.ndarray) -> None:
+        np.maximum(self._max, block.max(axis=1), out=self._max)
+
+    def result(self) -> np.ndarray:
+        return np.where(np.isfinite(self._max), self._max, 0.0)
+
+
+class TopKMeanAggregator(ScoreAggregator):
+    """
+    Mean of each candidate's `top_k` most similar corpus items, kept as a running buffer.
+    """
+
+    def __init__(self, num_candidates: int, **kwargs) -> None:
+        super().__init__(num_candidates, **kwargs)
+        self._best = np.empty((num_candidates, 0), dtype=np.float64)
+
+    def update(self, block: np.ndarray) -> None:
+        merged = np.concatenate([self._best, block], axis=1)
+        if merged.shape[1] > self.top_k:
+            merged = np.partition(merged, merged.shape[1] - self.top_k, axis=1)[:, -self.top_k :]
+        self._best = merged
+
+    def result(self) -> np.ndarray:
+        if not self._best.shape[1]:
+            return np.zeros(self.num_candidates, dtype=np.float64)
+        return self._best.mean(axis=1)
+
+
+class SoftmaxAggregator(ScoreAggregator):
+    """
+    Softmax-weighted mean similarity, `sum(softmax(s / T) * s)`, computed with a streaming log-sum-exp.
+    """
+
+    def __init__(self, num_candidates: int, **kwargs) -> None:
+        super().__init__(num_candidates, **kwargs)
+        self._max = np.full(num_candidates, -np.inf, dtype=np.float64)
+        self._weight = np.zeros(num_candidates, dtype=np.float64)
+        self._weighted = np.zeros(num_candidates, dtype=np.float64)
+
+    def update(self, block: np.ndarray) -> None:
+        scaled = block / self.temperature
+        new_max = np.maximum(self._max, scaled.max(axis=1))
+        rescale = np.exp(self._max - new_max)
+        weights = np.exp(scaled - new_max[:, None])
+        self._weight = self._weight * rescale + weights.sum(axis=1)
+        self._weighted = self._weighted * rescale + (weights * block).sum(axis=1)
+        self._max = new_max
+
+    def result(self) -> np.ndarray:
+        return np.divide(self._weighted, self._weight, out=np.zeros_like(self._weighted), where=self._weight > 0)
+
+
+AGGREGATORS: Dict[str, Type[ScoreAggregator]] = {
+    "mean": MeanAggregator,
+    "max": MaxAggregator,
+    "topk_mean": TopKMeanAggregator,
+    "softmax": SoftmaxAggregator,
+}
+
+
+def make_aggregator(name: str, num_candidates: int, top_k: int = 5, temperature: float = 0.05) -> ScoreAggregator:
+    try:
+        aggregator_cls = AGGREGATORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown similarity aggregation: {name!r} (expected one of {sorted(AGGREGATORS)})")
+    return aggregator_cls(num_candidates, top_k=top_k, temperature=temperature)
+
+
+def corpus_centroid(corpus_emb: np.ndarray, block_size: int = 2048) -> np.ndarray:
+    total = np.zeros(corpus_emb.shape[1], dtype=np.float64)
+    for start in range(0, corpus_emb.shape[0], block_size):
+        total += np.asarray(corpus_emb[start : start + block_size], dtype=np.float64).sum(axis=0)
+    return total / max(corpus_emb.shape[0], 1)
+
+
+def aggregate_embeddings(
+    cand_emb: np.ndarray,
+    corpus_emb: np.ndarray,
+    aggregation: str = "mean",
+    block_size: int = 2048,
+    top_k: int = 5,
+    temperature: float = 0.05,
+) -> np.ndarray:
+    """
+    Score each candidate against the corpus without materializing the full similarity matrix.
+
+    `mean` is a single dot product with the corpus centroid; the other aggregators stream the
+    corpus (which may be a memory map) in `block_size` rows, so peak memory is O(candidates x block).
+    """
+    if aggregation == "mean":
+        return np.asarray(cand_emb, dtype=np.float64) @ corpus_centroid(corpus_emb, block_size)
+
+    aggregator = make_aggregator(aggregation, cand_emb.shape[0], top_k=top_k, temperature=temperature)
+    for start in range(0, corpus_emb.shape[0], block_size):
+        block = np.asarray(corpus_emb[start : start + block_size])
+        aggregator.update(np.asarray(cand_emb @ block.T, dtype=np.float64))
+    return aggregator.result()
+
+
+def aggregate_matrix(scores: np.ndarray, aggregation: str = "mean", top_k: int = 5, temperature: float = 0.05) -> np.ndarray:
+    """
+    Apply an aggregator to an already materialized `(candidates, corpus)` score matrix.
+    """
+    aggregator = make_aggregator(aggregation, scores.shape[0], top_k=top_k, temperature=temperature)
+    if scores.shape[1]:
+        aggregator.update(np.asarray(scores, dtype=np.float64))
+    return aggregator.result()
@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 4096) -> np.ndarray:
+    labels = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], block_size):
+        block = np.asarray(vectors[start : start + block_size], dtype=np.float32)
+        labels[start : start + block_size] = (block @ centroids.T).argmax(axis=1)
+    return labels
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    k: int,
+    iterations: int = 15,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized k-means on unit vectors (cosine assignment, renormalized centroids).
+
+    Seeding is k-means++ on cosine distance. Returns `(centroids, labels)`. Empty clusters
+    are reseeded with the points that are currently worst served by their centroid.
+    """
+    data = np.asarray(vectors, dtype=np.float32)
+    n = data.shape[0]
+    k = max(1, min(int(k), n))
+    rng = np.random.default_rng(seed)
+    seeds = [int(rng.integers(n))]
+    closest = 1.0 - data @ data[seeds[0]]
+    for _ in range(1, k):
+        weights = np.clip(closest, 0.0, None) ** 2
+        total = weights.sum()
+        seed_idx = int(rng.choice(n, p=weights / total)) if total > 0 else int(rng.integers(n))
+        seeds.append(seed_idx)
+        np.minimum(closest, 1.0 - data @ data[seed_idx], out=closest)
+    centroids = data[seeds].copy()
+    labels = np.full(n, -1, dtype=np.int64)
+
+    for _ in range(iterations):
+        sims = data @ centroids.T
+        new_labels = sims.argmax(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        counts = np.bincount(labels, minlength=k)
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            worst = np.argsort(sims[np.arange(n), labels])[: len(empty)]
+            sums[empty] = data[worst]
+        centroids = _normalize_rows(sums).astype(np.float32)
+    return centroids, labels
+
+
+class IVFIndex:
+    """
+    Inverted-file index: corpus vectors are bucketed by their nearest k-means centroid and a
+    query only scans the `nprobe` closest buckets.
+
+    Items are identified by content hash, so the index survives corpus reordering and new
+    items are inserted incrementally into existing buckets. The index is retrained when the
+    corpus has doubled (or halved) since the last training.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, path: Path, nprobe: int = 8) -> None:
+        self.path = path
+        self.nprobe = max(1, int(nprobe))
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self._assignments: Dict[str, int] = {}
+        self._lists: List[np.ndarray] = []
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as payload:
+                self.centroids = payload["centroids"]
+                self.trained_size = int(payload["trained_size"])
+                self._assignments = dict(zip(payload["hashes"].tolist(), payload["lists"].tolist()))
+        except Exception as exc:
+            print(f"Ignoring unreadable ANN index at {self.path} ({exc}).")
+            self.centroids = None
+            self._assignments = {}
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_suffix(".tmp.npz")
+        hashes = list(self._assignments)
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            trained_size=np.asarray(self.trained_size),
+            hashes=np.asarray(hashes, dtype=str),
+            lists=np.asarray([self._assignments[h] for h in hashes], dtype=np.int64),
+        )
+        os.replace(tmp_path, self.path)
+
+    def sync(self, hashes: Sequence[str], embeddings: np.ndarray) -> None:
+        """
+        Align the index with the current corpus rows (`hashes[i]` is the id of `embeddings[i]`).
+        """
+        n = len(hashes)
+        needs_training = (
+            self.centroids is None
+            or self.centroids.shape[1] != embeddings.shape[1]
+            or n > 2 * self.trained_size
+            or 2 * n < self.trained_size
+        )
+        changed = False
+        if needs_training:
+            nlist = max(1, int(round(np.sqrt(n))))
+            # Train on a bounded sample, then assign every item to its nearest list.
+            sample_size = min(n, 64 * nlist)
+            sample = np.sort(np.random.default_rng(0).choice(n, size=sample_size, replace=False))
+            self.centroids, _ = spherical_kmeans(np.asarray(embeddings[sample]), nlist)
+            labels = _nearest_centroids(embeddings, self.centroids)
+            self.trained_size = n
+            self._assignments = dict(zip(hashes, labels.tolist()))
+            changed = True
+            print(f"ANN index trained: {len(self.centroids)} lists over {n} items.")
+        else:
+            current = set(hashes)
+            new_rows = [row for row, digest in enumerate(hashes) if digest not in self._assignments]
+            if new_rows:
+                labels = _nearest_centroids(np.asarray(embeddings[new_rows]), self.centroids)
+                for row, label in zip(new_rows, labels.tolist()):
+                    self._assignments[hashes[row]] = label
+            stale = [digest for digest in self._assignments if digest not in current]
+            for digest in stale:
+                del self._assignments[digest]
+            changed = bool(new_rows or stale)
+            if changed:
+                print(f"ANN index updated: {len(new_rows)} added, {len(stale)} removed.")
+        if changed:
+            self._save()
+
+        labels = np.asarray([self._assignments[digest] for digest in hashes], dtype=np.int64)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(len(self.centroids) + 1))
+        self._lists = [order[bounds[i] : bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def query(self, queries: np.ndarray, embeddings: np.ndarray, k: int) -> np.ndarray:
+        """
+        Return the `(len(queries), k)` similarities of each query's approximate top-k neighbours
+        (padded with -inf only when the whole corpus has fewer than k items), sorted descending.
+
+        Scoring is batched per list: each probed list is read once and scored against every
+        query that probes it in a single matrix product.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        probe_order = np.argsort(-(queries @ self.centroids.T), axis=1)
+        sizes = np.asarray([len(rows) for rows in self._lists])
+        # Probe `nprobe` lists, plus further ones where those hold fewer than k items in total.
+        covered = np.cumsum(sizes[probe_order], axis=1)
+        nprobe = np.maximum(self.nprobe, (covered < k).sum(axis=1) + 1)
+        probed = np.zeros((len(queries), len(self._lists)), dtype=bool)
+        ranks = np.arange(probe_order.shape[1])
+        np.put_along_axis(probed, probe_order, ranks[None, :] < nprobe[:, None], axis=1)
+
+        best = np.full((len(queries), k), -np.inf, dtype=np.float64)
+        for list_id, rows in enumerate(self._lists):
+            members = np.flatnonzero(probed[:, list_id])
+            if not len(rows) or not len(members):
+                continue
+            sims = queries[members] @ np.asarray(embeddings[rows], dtype=np.float32).T
+            merged = np.concatenate([best[members], sims], axis=1)
+            best[members] = np.partition(merged, merged.shape[1] - k, axis=1)[:, -k:]
+        return -np.sort(-best, axis=1)
+
+
+class HNSWIndex:
+    """
+    hnswlib graph index with integer labels mapped to content hashes; removed items are
+    marked deleted rather than rebuilt, until deleted items outnumber live ones (a mostly
+    deleted graph can no longer reach k live neighbours).
+
+    The search breadth `ef` is calibrated per query batch: it is doubled from its starting
+    value until recall@k on a sample of the queries reaches `recall_target` against exact
+    search. If `max_ef` misses the target, or the graph search becomes slower than exact
+    search on the sample first, the batch is scored exactly.
+    """
+
+    kind = "hnsw"
+
+    def __init__(
+        self,
+        path: Path,
+        ef: int = 64,
+        recall_target: float = 0.95,
+        max_ef: int = 1024,
+        calibration_queries: int = 32,
+    ) -> None:
+        import hnswlib  # optional dependency
+
+        self._hnswlib = hnswlib
+        self.path = path
+        self.labels_path = path.with_suffix(".labels.json")
+        self.ef = max(int(ef), 1)
+        self.recall_target = float(recall_target)
+        self.max_ef = max(int(max_ef), self.ef)
+        self.calibration_queries = max(int(calibration_queries), 1)
+        self._index = None
+        self._labels: Dict[str, int] = {}
+        self._next_label = 0
+        self._unique_rows: Optional[np.ndarray] = None
+
+    def _load(self, dim: int) -> None:
+        if self._index is not None:
+            return
+        index = self._hnswlib.Index(space="ip", dim=dim)
+        if self.path.exists() and self.labels_path.exists():
+            try:
+                meta = json.loads(self.labels_path.read_text(encoding="utf-8"))
+                index.load_index(str(self.path), allow_replace_deleted=False)
+                if index.get_current_count() != int(meta["next_label"]):
+                    raise ValueError("labels file does not match the graph")
+                self._labels = meta["labels"]
+                self._next_label = int(meta["next_label"])
+                self._index = index
+                return
+            except Exception as exc:
+                print(f"Ignoring unreadable HNSW index at {self.path} ({exc}).")
+                index = self._hnswlib.Index(space="ip", dim=dim)
+        self._reset(index, 1024)
+
+    def _reset(self, index, max_elements: int) -> None:
+        index.init_index(max_elements=max_elements, ef_construction=200, M=32)
+        self._labels = {}
+        self._next_label = 0
+        self._index = index
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_suffix(".tmp.bin")
+        tmp_labels = self.labels_path.with_suffix(".tmp")
+        self._index.save_index(str(tmp_path))
+        tmp_labels.write_text(
+            json.dumps({"labels": self._labels, "next_label": self._next_label}),
+            encoding="utf-8",
+        )
+        # A crash between the two replaces leaves a graph whose size disagrees with the labels
+        # file; `_load` checks for that and starts over.
+        os.replace(tmp_path, self.path)
+        os.replace(tmp_labels, self.labels_path)
+
+    def sync(self, hashes: Sequence[str], embeddings: np.ndarray) -> None:
+        self._load(embeddings.shape[1])
+        # One graph node per distinct text: the first row holding it.
+        first_rows: Dict[str, int] = {}
+        for row, digest in enumerate(hashes):
+            first_rows.setdefault(digest, row)
+        new_rows = [row for digest, row in first_rows.items() if digest not in self._labels]
+        self._unique_rows = None if len(first_rows) == len(hashes) else np.fromiter(first_rows.values(), dtype=np.int64)
+        stale = [digest for digest in self._labels if digest not in first_rows]
+        for digest in stale:
+            self._index.mark_deleted(self._labels.pop(digest))
+        rebuilt = bool(stale) and self._next_label - len(self._labels) > len(self._labels)
+        if rebuilt:
+            self._reset(self._hnswlib.Index(space="ip", dim=embeddings.shape[1]), max(1024, len(first_rows)))
+            new_rows = list(first_rows.values())
+        if new_rows:
+            needed = self._next_label + len(new_rows)
+            if needed > self._index.get_max_elements():
+                self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+            labels = np.arange(self._next_label, needed)
+            self._index.add_items(np.asarray(embeddings[new_rows], dtype=np.float32), labels)
+            for row, label in zip(new_rows, labels.tolist()):
+                self._labels[hashes[row]] = label
+            self._next_label = needed
+        if new_rows or stale:
+            self._save()
+            if rebuilt:
+                print(f"ANN index rebuilt with {len(new_rows)} items after {len(stale)} removals.")
+            else:
+                print(f"ANN index updated: {len(new_rows)} added, {len(stale)} removed.")
+        self._index.set_ef(max(self.ef, 1))
+
+    def _calibrate(self, queries: np.ndarray, embeddings: np.ndarray, k: int) -> bool:
+        """
+        Raise `self.ef` until recall@k on a sample of `queries` reaches the target. False when
+        the target is out of reach, or the graph search got slower than exact search first.
+        """
+        picks = np.unique(np.linspace(0, len(queries) - 1, min(len(queries), self.calibration_queries)).astype(int))
+        sample = queries[picks]
+        start = time.perf_counter()
+        threshold = exact_top_k(sample, embeddings, k)[:, -1:] - 1e-6
+        exact_seconds = time.perf_counter() - start
+        ef = max(self.ef, k)
+        while True:
+            self._index.set_ef(ef)
+            start = time.perf_counter()
+            _labels, distances = self._index.knn_query(sample, k=k)
+            ann_seconds = time.perf_counter() - start
+            recall = float(np.mean((1.0 - distances >= threshold).sum(axis=1) / k))
+            if recall >= self.recall_target or ann_seconds > exact_seconds or ef >= self.max_ef:
+                break
+            ef = min(2 * ef, self.max_ef)
+        self.ef = ef
+        if ann_seconds > exact_seconds:
+            print(f"HNSW search at ef={ef} is slower than exact search (recall@{k} {recall:.2f}); scoring exactly.")
+            return False
+        if recall < self.recall_target:
+            print(f"HNSW recall@{k} is {recall:.2f} at ef={ef}, below the {self.recall_target:.2f} target; scoring exactly.")
+            return False
+        return True
+
+    def query(self, queries: np.ndarray, embeddings: np.ndarray, k: int) -> np.ndarray:
+        live = min(len(self._labels), self._index.get_current_count())
+        result = np.full((len(queries), k), -np.inf, dtype=np.float64)
+        if not live or not len(queries):
+            return result
+        top = min(k, live)
+        queries = np.asarray(queries, dtype=np.float32)
+        if self._unique_rows is not None:
+            # Score against the same one-row-per-text corpus the graph holds.
+            embeddings = np.asarray(embeddings[self._unique_rows])
+        try:
+            if self._calibrate(queries, embeddings, top):
+                _labels, distances = self._index.knn_query(queries, k=top)
+                # hnswlib's "ip" distance is 1 - dot product.
+                result[:, :top] = 1.0 - distances
+                return result
+        except RuntimeError:
+            # hnswlib raises when the graph walk finds fewer than `top` live items.
+            pass
+        top = min(top, embeddings.shape[0])
+        result[:, :top] = exact_top_k(queries, embeddings, top)
+        return result
+
+
+def open_index(directory: Path, kind: str, nprobe: int = 8):
+    """
+    Open (or create) the ANN index of `kind` ("ivf" or "hnsw") stored in `directory`.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    if kind == "hnsw":
+        return HNSWIndex(directory / "hnsw.bin", ef=max(64, 8 * nprobe))
+    if kind == "ivf":
+        return IVFIndex(directory / "ivf.npz", nprobe=nprobe)
+    raise ValueError(f"Unknown ANN index: {kind!r} (expected 'ivf' or 'hnsw')")
+
+
+def exact_top_k(queries: np.ndarray, embeddings: np.ndarray, k: int, block_size: int = 2048) -> np.ndarray:
+    """
+    Exact `(len(queries), k)` top-k similarities, streamed over corpus blocks.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    best = np.empty((len(queries), 0), dtype=np.float64)
+    for start in range(0, embeddings.shape[0], block_size):
+        block = np.asarray(embeddings[start : start + block_size], dtype=np.float32)
+        merged = np.concatenate([best, queries @ block.T], axis=1)
+        if merged.shape[1] > k:
+            merged = np.partition(merged, merged.shape[1] - k, axis=1)[:, -k:]
+        best = merged
+    return -np.sort(-best, axis=1)
+
+
+def evaluate_index(index, queries: np.ndarray, embeddings: np.ndarray, k: int) -> Dict[str, float]:
+    """
+    Compare an ANN index against the exact path: recall@k of the neighbour similarities and query latency.
+    """
+    start = time.perf_counter()
+    exact = exact_top_k(queries, embeddings, k)
+    exact_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    approx = index.query(queries, embeddings, k)
+    ann_seconds = time.perf_counter() - start
+    # Recall by value: a neighbour is found if its similarity reaches the exact k-th best.
+    threshold = exact[:, -1:] - 1e-6
+    recall = float(np.mean((approx >= threshold).sum(axis=1) / exact.shape[1]))
+    return {"recall": recall, "exact_seconds": exact_seconds, "ann_seconds": ann_seconds}
@@ -0,0 +1,284 @@
+"""
+Local stand-in for an OpenAI-compatible endpoint, for dry runs of the LLM enrichment paths.
+
+Serves `/v1/chat/completions`, `/v1/files`, `/v1/files/{id}/content` and `/v1/batches[/{id}]`
+from memory. Answers follow the prompt: relevance prompts get `{"match", "score", "reason"}` with
+a score derived from the paper, multi-paper prompts get `{"papers": [{"id", ...}]}` and other
+JSON-mode prompts get the fields their instructions name, echoing the paper title; plain-text
+requests get the first line of the user message back. Batches report `in_progress` on the first
+poll and `completed` afterwards.
+
+    python batch_stub_server.py --port 8765
+    # then set llm.base_url to http://127.0.0.1:8765/v1
+
+`--check` starts the server on a free port, runs the scoring, rerank and enrichment paths
+(synchronous, multi-paper and batch API, every field combination, token budget) against it and
+exits non-zero on the first mismatch.
+"""
+
+from __future__ import annotations
+
+import argparse
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+import zlib
+
+
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_files: Dict[str, bytes] = {}
+_batches: Dict[str, Dict[str, Any]] = {}
+
+
+_FIELDS = ("tldr", "abstract_zh")
+
+
+def _json_answer(system: str, user: str) -> Dict[str, Any]:
+    if '"match"' in system:
+        score = zlib.crc32(user.encode("utf-8")) % 101 / 100
+        return {"match": score >= 0.5, "score": score, "reason": f"[stub] {score:.2f}"}
+    fields = [name for name in _FIELDS if f'"{name}"' in system]
+    if '"papers"' in system:
+        papers = json.loads(user.split("\n", 1)[1])
+        return {"papers": [{"id": paper["id"], **{name: f"[stub] {paper['title']}" for name in fields}} for paper in papers]}
+    first_line = user.splitlines()[0] if user else ""
+    return {name: f"[stub] {first_line}" for name in fields}
+
+
+def _completion(body: Dict[str, Any]) -> Dict[str, Any]:
+    messages = body.get("messages") or []
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        content = json.dumps(_json_answer(system, user), ensure_ascii=False)
+    else:
+        content = f"[stub] {user.splitlines()[0] if user else ''}"
+    prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages") or []) // 4
+    return {
+        "id": f"chatcmpl-{next(_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        },
+    }
+
+
+def _run_batch(input_file_id: str) -> str:
+    lines = []
+    for line in _files.get(input_file_id, b"").decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        lines.append(
+            json.dumps(
+                {
+                    "id": f"batch_req_{next(_ids)}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "body": _completion(request["body"])},
+                    "error": None,
+                },
+                ensure_ascii=False,
+            )
+        )
+    output_id = f"file-{next(_ids)}"
+    _files[output_id] = ("\n".join(lines) + "\n").encode("utf-8")
+    return output_id
+
+
+def _batch_object(batch: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": batch["id"],
+        "object": "batch",
+        "endpoint": batch["endpoint"],
+        "input_file_id": batch["input_file_id"],
+        "completion_window": "24h",
+        "status": batch["status"],
+        "output_file_id": batch.get("output_file_id"),
+        "error_file_id": None,
+        "created_at": batch["created_at"],
+        "request_counts": batch.get("request_counts", {"total": 0, "completed": 0, "failed": 0}),
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def _send(self, status: int, payload: Any, raw: bool = False) -> None:
+        data = payload if raw else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> Tuple[str, bytes]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.headers.get("Content-Type", ""), self.rfile.read(length)
+
+    def do_POST(self) -> None:
+        content_type, raw = self._body()
+        path = self.path.rstrip("/")
+        with _lock:
+            if path.endswith("/chat/completions"):
+                return self._send(200, _completion(json.loads(raw)))
+            if path.endswith("/files"):
+                message = BytesParser(policy=HTTP).parsebytes(
+                    f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + raw
+                )
+                upload = next((part for part in message.iter_parts() if part.get_filename()), None)
+                data = upload.get_payload(decode=True) if upload is not None else b""
+                file_id = f"file-{next(_ids)}"
+                _files[file_id] = data
+                return self._send(
+                    200,
+                    {
+                        "id": file_id,
+                        "object": "file",
+                        "bytes": len(data),
+                        "created_at": int(time.time()),
+                        "filename": upload.get_filename() if upload is not None else "upload.jsonl",
+                        "purpose": "batch",
+                        "status": "processed",
+                    },
+                )
+            if path.endswith("/batches"):
+                body = json.loads(raw)
+                batch = {
+                    "id": f"batch_{next(_ids)}",
+                    "endpoint": body["endpoint"],
+                    "input_file_id": body["input_file_id"],
+                    "status": "validating",
+                    "created_at": int(time.time()),
+                }
+                _batches[batch["id"]] = batch
+                return self._send(200, _batch_object(batch))
+            if path.endswith("/cancel"):
+                batch = _batches.get(path.split("/")[-2])
+                if batch is None:
+                    return self._send(404, {"error": {"message": "batch not found"}})
+                batch["status"] = "cancelled"
+                return self._send(200, _batch_object(batch))
+        self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_GET(self) -> None:
+        parts = self.path.rstrip("/").split("/")
+        with _lock:
+            if len(parts) >= 2 and parts[-1] == "content" and parts[-2] in _files:
+                return self._send(200, _files[parts[-2]], raw=True)
+            if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in _batches:
+                batch = _batches[parts[-1]]
+                if batch["status"] == "validating":
+                    batch["status"] = "in_progress"
+                elif batch["status"] == "in_progress":
+                    batch["output_file_id"] = _run_batch(batch["input_file_id"])
+                    total = _files[batch["output_file_id"]].count(b"\n")
+                    batch["request_counts"] = {"total": total, "completed": total, "failed": 0}
+                    batch["status"] = "completed"
+                return self._send(200, _batch_object(batch))
+        self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """
+    Start the stand-in server on a background thread and return it (call `shutdown()` to stop).
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="batch-stub-server", daemon=True).start()
+    return server
+
+
+def _expect(condition: bool, message: str) -> None:
+    if not condition:
+        raise AssertionError(message)
+
+
+def _expect_fields(results: List[Any], expected: List[str], label: str) -> None:
+    for fields in results:
+        _expect(fields is not None and sorted(fields) == sorted(expected), f"{label}: got {fields}, want {expected}")
+        _expect(all(str(value).startswith("[stub]") for value in fields.values()), f"{label}: empty field in {fields}")
+
+
+def check() -> None:
+    """
+    Run the LLM paths against a fresh server and raise `AssertionError` on the first mismatch.
+    """
+    from llm_batch import batch_enrich
+    from llm_limiter import LLMRateLimiter
+    from llm_rerank import llm_rerank
+    from llm_utils import LLMScorer
+
+    server = serve(port=0)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    def scorer(token_budget: int = 0) -> LLMScorer:
+        return LLMScorer("stub", base_url, "stub-model", limiter=LLMRateLimiter(token_budget=token_budget))
+
+    papers = [
+        {"id": f"p{index}", "title": f"Paper {index}", "abstract": f"Abstract of paper {index}.", "score": 1 - index / 10}
+        for index in range(1, 5)
+    ]
+    combos = {(True, True): _FIELDS, (True, False): ("abstract_zh",), (False, True): ("tldr",), (False, False): ()}
+    try:
+        sync = scorer()
+        _expect_fields([sync.enrich("Paper 1", "Abstract of paper 1.")], list(_FIELDS), "enrich")
+        for (translate, tldr), fields in combos.items():
+            results = sync.enrich_batch(papers, translate=translate, tldr=tldr)
+            _expect_fields(results, list(fields), f"enrich_batch translate={translate} tldr={tldr}")
+
+        reranked = llm_rerank(papers, sync, "robot learning", top_k=2, concurrency=2, confident_score=1.1)
+        _expect(len(reranked) == 2, f"llm_rerank returned {len(reranked)} papers")
+        _expect(all(item["llm_score"] is not None for item in reranked), f"llm_rerank left papers unscored: {reranked}")
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            for (translate, tldr), fields in combos.items():
+                batch = scorer()
+                results = batch_enrich(
+                    papers, batch, work_dir, poll_seconds=0, translate=translate, tldr=tldr
+                )
+                label = f"batch_enrich translate={translate} tldr={tldr}"
+                if fields:
+                    _expect_fields(results, list(fields), label)
+                    _expect(batch.limiter.tokens_used > 0, f"{label}: batch tokens not charged to the budget")
+                else:
+                    _expect(results == [None] * len(papers), f"{label}: got {results}")
+                    _expect(batch.limiter.tokens_used == 0, f"{label}: submitted a batch")
+
+            small = scorer(token_budget=10)
+            results = batch_enrich(papers, small, work_dir, poll_seconds=0)
+            _expect(results == [None] * len(papers), f"batch_enrich over budget: got {results}")
+            _expect(small.limiter.tokens_used == 0, "batch_enrich over budget: tokens charged")
+            _expect(not small.limiter.budget_exhausted, "batch_enrich over budget: closed the budget for sync calls")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for an OpenAI-compatible chat/batch API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--check", action="store_true", help="run the LLM paths against the stub and exit")
+    args = parser.parse_args()
+    if args.check:
+        try:
+            check()
+        except AssertionError as exc:
+            print(f"Stub check failed: {exc}")
+            sys.exit(1)
+        print("Stub check passed.")
+        sys.exit(0)
+    print(f"Stub LLM API listening on http://{args.host}:{args.port}/v1")
+    ThreadingHTTPServer((args.host, args.port), _Handler).serve_forever()
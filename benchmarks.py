@@ -0,0 +1,197 @@
+"""
+Benchmarks for the scoring paths, kept out of the modules the daily run imports.
+
+Each benchmark compares an optimized path with the implementation it replaced (or with an
+alternative schedule) on fixed inputs and prints a JSON report.
+
+    python benchmarks.py bow
+    python benchmarks.py backends <model> [--onnx-dir DIR]
+    python benchmarks.py buckets <model> [--backend onnx] [--max-tokens 256]
+"""
+
+from __future__ import annotations
+
+import argparse
+from collections import Counter
+import json
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from aggregation import aggregate_embeddings
+from similarity import (
+    DEFAULT_ONNX_DIR,
+    EMBEDDING_BACKENDS,
+    _bow_cosine_scores,
+    _encode_batch,
+    _encode_texts,
+    _length_buckets,
+    _token_lengths,
+    _tokenize,
+    load_model,
+)
+
+
+def bow_cosine_scores_pairwise(candidates: Sequence[str], corpus: Sequence[str]) -> np.ndarray:
+    """
+    Reference per-pair implementation that `similarity._bow_cosine_scores` replaced.
+    """
+    cand_counters = [Counter(_tokenize(text)) for text in candidates]
+    corpus_counters = [Counter(_tokenize(text)) for text in corpus]
+    cand_norms = [sum(v * v for v in counter.values()) ** 0.5 or 1.0 for counter in cand_counters]
+    corpus_norms = [sum(v * v for v in counter.values()) ** 0.5 or 1.0 for counter in corpus_counters]
+    scores = np.zeros((len(candidates), len(corpus)), dtype=float)
+    for i, cand_counter in enumerate(cand_counters):
+        for j, corpus_counter in enumerate(corpus_counters):
+            common = set(cand_counter) & set(corpus_counter)
+            if common:
+                dot = sum(cand_counter[token] * corpus_counter[token] for token in common)
+                scores[i, j] = dot / (cand_norms[i] * corpus_norms[j])
+    return scores
+
+
+def synthetic_abstracts(
+    count: int,
+    min_words: int = 150,
+    max_words: int = 150,
+    vocab_size: int = 20000,
+    seed: int = 0,
+) -> List[str]:
+    """
+    Deterministic pseudo-abstracts with Zipf-distributed words.
+    """
+    rng = np.random.default_rng(seed)
+    ranks = np.arange(1, vocab_size + 1, dtype=np.float64)
+    weights = 1.0 / ranks
+    weights /= weights.sum()
+    lengths = rng.integers(min_words, max_words + 1, size=count)
+    return [" ".join(f"w{word}" for word in rng.choice(vocab_size, size=int(length), p=weights)) for length in lengths]
+
+
+def benchmark_bow_scorer(
+    candidates: Optional[Sequence[str]] = None,
+    corpus: Optional[Sequence[str]] = None,
+) -> Dict[str, float]:
+    """
+    Time the vectorized bag-of-words scorer against the per-pair reference loop.
+
+    Defaults to 251 candidates x 3001 corpus texts of 150 Zipfian words. Reports both
+    timings, the speedup and the largest absolute score difference.
+    """
+    candidates = list(candidates) if candidates is not None else synthetic_abstracts(251, seed=1)
+    corpus = list(corpus) if corpus is not None else synthetic_abstracts(3001, seed=2)
+    start = time.perf_counter()
+    reference = bow_cosine_scores_pairwise(candidates, corpus)
+    pairwise_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    vectorized = _bow_cosine_scores(candidates, corpus)
+    vectorized_seconds = time.perf_counter() - start
+    return {
+        "pairwise_seconds": pairwise_seconds,
+        "vectorized_seconds": vectorized_seconds,
+        "speedup": pairwise_seconds / max(vectorized_seconds, 1e-9),
+        "max_abs_diff": float(np.abs(reference - vectorized).max()) if reference.size else 0.0,
+    }
+
+
+def compare_backends(
+    model_name: str,
+    candidate_texts: Optional[Sequence[str]] = None,
+    corpus_texts: Optional[Sequence[str]] = None,
+    onnx_dir: str = DEFAULT_ONNX_DIR,
+    top_k: int = 10,
+) -> Dict[str, float]:
+    """
+    Benchmark the ONNX int8 backend against the torch path on a fixed set of texts.
+
+    Defaults to 100 candidates x 400 corpus synthetic abstracts of 45-340 words; pass real
+    titles and abstracts to judge ranking agreement, which random words say little about.
+
+    Reports encoding throughput (texts/s, models preloaded) for both backends and how well the
+    int8 ranking of candidates (mean similarity to the corpus) agrees with the torch ranking:
+    Spearman correlation and top-k overlap.
+    """
+    candidate_texts = list(candidate_texts) if candidate_texts is not None else synthetic_abstracts(100, 45, 340, seed=4)
+    corpus_texts = list(corpus_texts) if corpus_texts is not None else synthetic_abstracts(400, 45, 340, seed=5)
+    rankings: Dict[str, np.ndarray] = {}
+    report: Dict[str, float] = {}
+    texts = list(corpus_texts) + list(candidate_texts)
+    for backend in EMBEDDING_BACKENDS:
+        load_model(model_name, backend=backend, onnx_dir=onnx_dir)
+        start = time.perf_counter()
+        embeddings = _encode_texts(model_name, texts, backend=backend, onnx_dir=onnx_dir)
+        report[f"{backend}_texts_per_second"] = len(texts) / max(time.perf_counter() - start, 1e-9)
+        corpus_emb, cand_emb = embeddings[: len(corpus_texts)], embeddings[len(corpus_texts) :]
+        rankings[backend] = aggregate_embeddings(cand_emb, corpus_emb, "mean")
+
+    torch_rank = np.argsort(np.argsort(-rankings["torch"]))
+    onnx_rank = np.argsort(np.argsort(-rankings["onnx"]))
+    report["spearman"] = float(np.corrcoef(torch_rank, onnx_rank)[0, 1]) if len(torch_rank) > 1 else 1.0
+    k = min(top_k, len(candidate_texts))
+    top_torch = set(np.argsort(-rankings["torch"])[:k].tolist())
+    top_onnx = set(np.argsort(-rankings["onnx"])[:k].tolist())
+    report[f"top{k}_overlap"] = len(top_torch & top_onnx) / max(k, 1)
+    report["speedup"] = report["onnx_texts_per_second"] / max(report["torch_texts_per_second"], 1e-9)
+    return report
+
+
+def _padding_overhead(lengths: Sequence[int], batches: Iterable[Sequence[int]]) -> float:
+    real = sum(lengths)
+    padded = sum(len(batch) * max(lengths[i] for i in batch) for batch in batches if len(batch))
+    return (padded - real) / max(real, 1)
+
+
+def benchmark_length_buckets(
+    model_name: str,
+    texts: Optional[Sequence[str]] = None,
+    backend: str = "torch",
+    onnx_dir: str = DEFAULT_ONNX_DIR,
+    max_tokens: int = 0,
+    batch_size: int = 32,
+) -> Dict[str, float]:
+    """
+    Compare length-bucketed encoding with fixed-size batches in input order.
+
+    Defaults to 500 synthetic abstracts of 45-340 words. Reports the padding overhead
+    (padded / real tokens - 1) and throughput (texts/s, model preloaded) of both schedules.
+    """
+    texts = list(texts) if texts is not None else synthetic_abstracts(500, 45, 340, seed=3)
+    model = load_model(model_name, backend=backend, onnx_dir=onnx_dir)
+    lengths, limit = _token_lengths(model, backend, texts, max_tokens)
+    buckets = _length_buckets(lengths, max_batch_tokens=batch_size * limit, max_batch_size=8 * batch_size)
+    unsorted = [np.arange(start, min(start + batch_size, len(texts))) for start in range(0, len(texts), batch_size)]
+    report: Dict[str, float] = {"max_tokens": float(limit)}
+    for name, batches in (("unsorted", unsorted), ("bucketed", buckets)):
+        start = time.perf_counter()
+        for batch in batches:
+            _encode_batch(model, backend, [texts[i] for i in batch], limit)
+        report[f"{name}_texts_per_second"] = len(texts) / max(time.perf_counter() - start, 1e-9)
+        report[f"{name}_padding_overhead"] = _padding_overhead(lengths, batches)
+    report["speedup"] = report["bucketed_texts_per_second"] / max(report["unsorted_texts_per_second"], 1e-9)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the scoring paths on fixed inputs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("bow", help="vectorized bag-of-words scorer vs the per-pair loop")
+    backends = commands.add_parser("backends", help="ONNX int8 backend vs torch: throughput and ranking agreement")
+    backends.add_argument("model")
+    backends.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR)
+    buckets = commands.add_parser("buckets", help="length-bucketed encoding vs fixed-size batches")
+    buckets.add_argument("model")
+    buckets.add_argument("--backend", choices=EMBEDDING_BACKENDS, default="torch")
+    buckets.add_argument("--onnx-dir", default=DEFAULT_ONNX_DIR)
+    buckets.add_argument("--max-tokens", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "bow":
+        report = benchmark_bow_scorer()
+    elif args.command == "backends":
+        report = compare_backends(args.model, onnx_dir=args.onnx_dir)
+    else:
+        report = benchmark_length_buckets(
+            args.model, backend=args.backend, onnx_dir=args.onnx_dir, max_tokens=args.max_tokens
+        )
+    print(json.dumps({key: round(value, 6) for key, value in report.items()}, indent=2))
@@ -83,6 +83,8 @@ def load_config(path: str = "config.yaml") -> Dict:
     cfg["wechat"].setdefault("title", "每日论文推送")
     cfg["zotero"].setdefault("library_type", "user")
     cfg["zotero"].setdefault("item_types", ["conferencePaper", "journalArticle", "preprint"])
+    cfg["zotero"].setdefault("snapshot_path", "")
+    cfg["zotero"].setdefault("fetch_workers", 4)
     cfg["query"].setdefault("max_results", 5)
     cfg["query"].setdefault("include_abstract", True)
     cfg["query"].setdefault("translate_abstract", True)
@@ -96,11 +98,63 @@ def load_config(path: str = "config.yaml") -> Dict:
     cfg["arxiv"].setdefault("only_new", True)
     cfg["arxiv"].setdefault("source", "rss")
     cfg["embedding"].setdefault("model", "avsolatorio/GIST-small-Embedding-v0")
+    cfg["embedding"].setdefault("cache_dir", "")
+    cfg["embedding"].setdefault("backend", "torch")
+    cfg["embedding"].setdefault("onnx_dir", ".cache/onnx")
+    cfg["embedding"].setdefault("max_tokens", 256)
+    cfg["embedding"].setdefault("batch_size", 32)
+    cfg["embedding"].setdefault("include_title", False)
+    cfg["embedding"].setdefault("aggregation", "mean")
+    cfg["embedding"].setdefault("block_size", 2048)
+    cfg["embedding"].setdefault("neighbors", 5)
+    cfg["embedding"].setdefault("softmax_temperature", 0.05)
+    cfg["embedding"].setdefault("ann", "")
+    cfg["embedding"].setdefault("ann_nprobe", 8)
+    cfg["embedding"].setdefault("ann_min_corpus", 5000)
+    cfg["embedding"].setdefault("profile_clusters", 8)
     cfg["llm"].setdefault("temperature", 0.0)
+    cfg["llm"].setdefault("concurrency", 4)
+    cfg["llm"].setdefault("batch_size", 8)
+    cfg["llm"].setdefault("batch_max_tokens", 6000)
+    cfg["llm"].setdefault("requests_per_minute", 0)
+    cfg["llm"].setdefault("tokens_per_minute", 0)
+    cfg["llm"].setdefault("token_budget", 0)
+    cfg["llm"].setdefault("max_retries", 4)
+    cfg["llm"].setdefault("max_abstract_tokens", 600)
+    cfg["llm"].setdefault("input_price", 0.0)
+    cfg["llm"].setdefault("output_price", 0.0)
+    cfg["llm"].setdefault("cached_input_price", None)
+    cfg["llm"].setdefault("mode", "sync")
+    cfg["llm"].setdefault("batch_dir", ".cache/llm_batches")
+    cfg["llm"].setdefault("batch_poll_seconds", 30)
+    cfg["llm"].setdefault("batch_timeout_minutes", 300)
+    cfg["llm"].setdefault("rerank", False)
+    cfg["llm"].setdefault("rerank_shortlist", 20)
+    cfg["llm"].setdefault("rerank_weight", 0.5)
+    cfg["llm"].setdefault("rerank_confident_score", 0.8)
+    cfg["llm"].setdefault("rerank_profile", "")
+    cfg["llm"].setdefault("rerank_cache_path", ".cache/llm_rerank.json")
+    cfg["llm"].setdefault("cache_path", "")
+    cfg["llm"].setdefault("cache_max_entries", 5000)
+    cfg["llm"].setdefault("cache_ttl_days", 14)
     cfg["llm"].setdefault("base_url", "https://api.openai.com/v1")
     cfg["output"].setdefault("root_dir", "output/digests")
     cfg["output"].setdefault("include_figures", True)
     cfg["output"].setdefault("figure_pages", 3)
+    cfg["output"].setdefault("figure_download_workers", 4)
+    cfg["output"].setdefault("figure_per_host", 2)
+    cfg["output"].setdefault("figure_extract_workers", 0)
+    cfg["output"].setdefault("figure_cache_dir", "")
+    cfg["output"].setdefault("figure_cache_max_mb", 200)
+    cfg["output"].setdefault("max_pdf_mb", 40)
+    cfg["output"].setdefault("pdf_cache_dir", "")
+    cfg["output"].setdefault("pdf_cache_max_mb", 500)
+    cfg["output"].setdefault("figure_max_width", 1200)
+    cfg["output"].setdefault("figure_format", "auto")
+    cfg["output"].setdefault("figure_quality", 85)
+    cfg["output"].setdefault("preview_dpi", 100)
+    cfg["output"].setdefault("preview_width", 0)
+    cfg["output"].setdefault("preview_crop", True)
     return cfg
 
 
@@ -1,22 +1,41 @@
 from __future__ import annotations
 
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from io import BytesIO
+import json
+import multiprocessing
+import os
 from pathlib import Path
 import re
 import shutil
 import subprocess
-from typing import Dict, Iterable, List, Optional
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
 
+import numpy as np
 from PIL import Image
 import requests
+from requests.adapters import HTTPAdapter
+
+from figure_cache import FigureCache
 
 try:
     from pypdf import PdfReader
 except ImportError:  # pragma: no cover - optional dependency at runtime
     PdfReader = None
 
+try:
+    import pypdfium2
+except ImportError:  # pragma: no cover - platforms without wheels render with pdftoppm
+    pypdfium2 = None
+
+# PDFium is not thread-safe; processes render in parallel, threads within one take turns.
+_PDFIUM_LOCK = threading.Lock()
+
 
 _NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
 
@@ -49,20 +68,240 @@ def _pdf_url(paper: Dict) -> Optional[str]:
     return None
 
 
-def _download_pdf(pdf_url: str, pdf_path: Path) -> bool:
-    response = requests.get(pdf_url, timeout=30)
-    response.raise_for_status()
-    pdf_path.write_bytes(response.content)
-    return pdf_path.stat().st_size > 0
-
-
-def _save_image(image: Image.Image, output_path: Path) -> Path:
+_DOWNLOAD_CHUNK = 256 * 1024
+
+
+class PdfTooLarge(Exception):
+    pass
+
+
+def _download_pdf(
+    pdf_url: str,
+    pdf_path: Path,
+    session: Optional[requests.Session] = None,
+    max_bytes: int = 0,
+    cache_dir: Optional[Path] = None,
+) -> int:
+    """
+    Stream `pdf_url` to `pdf_path` in chunks and return the number of bytes transferred.
+
+    Raises `PdfTooLarge` once the body (or its Content-Length) exceeds `max_bytes` (0 = no cap).
+    With `cache_dir`, the PDF and its ETag / Last-Modified are kept there and later downloads
+    send a conditional request; a 304 reuses the cached copy (refreshing its modification time,
+    which `_evict_pdf_cache` uses as last access) and transfers 0 bytes.
+    """
+    cached_pdf = cache_dir / pdf_path.name if cache_dir is not None else None
+    validators_path = cached_pdf.with_suffix(".json") if cached_pdf is not None else None
+    headers: Dict[str, str] = {}
+    if cached_pdf is not None and cached_pdf.exists() and validators_path.exists():
+        try:
+            validators = json.loads(validators_path.read_text(encoding="utf-8"))
+        except Exception:
+            validators = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    with (session or requests).get(pdf_url, headers=headers, timeout=30, stream=True) as response:
+        if response.status_code == 304 and headers:
+            shutil.copyfile(cached_pdf, pdf_path)
+            os.utime(cached_pdf)
+            return 0
+        response.raise_for_status()
+        declared = int(response.headers.get("Content-Length") or 0)
+        if max_bytes and declared > max_bytes:
+            raise PdfTooLarge(f"{pdf_url} is {declared} bytes (cap {max_bytes})")
+
+        part_path = pdf_path.with_suffix(".part")
+        transferred = 0
+        try:
+            with part_path.open("wb") as handle:
+                for chunk in response.iter_content(chunk_size=_DOWNLOAD_CHUNK):
+                    transferred += len(chunk)
+                    if max_bytes and transferred > max_bytes:
+                        raise PdfTooLarge(f"{pdf_url} exceeded {max_bytes} bytes")
+                    handle.write(chunk)
+            os.replace(part_path, pdf_path)
+        finally:
+            part_path.unlink(missing_ok=True)
+
+        if cached_pdf is not None and transferred and (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(pdf_path, cached_pdf)
+            validators_path.write_text(
+                json.dumps(
+                    {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+                ),
+                encoding="utf-8",
+            )
+    return transferred
+
+
+def _evict_pdf_cache(cache_dir: Path, max_bytes: int) -> None:
+    """
+    Delete the least recently used PDFs in `cache_dir`, with their validators, until the cached
+    PDFs fit in `max_bytes` (0 = no cap).
+    """
+    if not max_bytes or not cache_dir.is_dir():
+        return
+    pdfs = [(path.stat(), path) for path in cache_dir.glob("*.pdf")]
+    total = sum(stat.st_size for stat, _ in pdfs)
+    evicted = 0
+    for stat, path in sorted(pdfs, key=lambda item: item[0].st_mtime):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        path.with_suffix(".json").unlink(missing_ok=True)
+        total -= stat.st_size
+        evicted += 1
+    if evicted:
+        print(f"PDF cache: evicted {evicted} PDFs, {total / 1024 / 1024:.1f} MB kept.")
+
+
+def _pooled_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class _HostLimiter:
+    """
+    Caps concurrent downloads per host so a thread pool does not hammer a single server.
+    """
+
+    def __init__(self, per_host: int) -> None:
+        self.per_host = max(1, per_host)
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+    def __call__(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+@dataclass(frozen=True)
+class ImageOptions:
+    """
+    How figures are stored: `max_width` in pixels (0 = keep), `format` one of "png", "jpeg",
+    "webp" or "auto", and the lossy `quality`.
+
+    First-page previews are rendered at `preview_dpi`, or scaled to `preview_width` pixels when
+    that is set, and cropped to the figure-dense region of the page with `preview_crop`.
+    """
+
+    max_width: int = 0
+    format: str = "png"
+    quality: int = 85
+    preview_dpi: int = 150
+    preview_width: int = 0
+    preview_crop: bool = False
+
+    def variant(self) -> str:
+        """
+        Short tag of these settings, used to keep figure cache entries per encoding.
+        """
+        preview = f"w{self.preview_width}" if self.preview_width else f"d{self.preview_dpi}"
+        return f"w{self.max_width}-{self.format}-q{self.quality}-{preview}{'c' if self.preview_crop else ''}"
+
+
+_FORMAT_SUFFIXES = {"PNG": ".png", "JPEG": ".jpg", "WEBP": ".webp"}
+
+
+def _is_photographic(image: Image.Image) -> bool:
+    sample = image.copy()
+    sample.thumbnail((256, 256))
+    return sample.getcolors(maxcolors=4096) is None
+
+
+def _save_image(image: Image.Image, output_path: Path, options: ImageOptions = ImageOptions()) -> Dict:
+    """
+    Downscale, pick the encoding and save `image` next to `output_path` (the suffix follows the
+    format). Metadata is dropped. Returns `{"path", "width", "height"}`.
+
+    With `format="auto"` (or "webp"), photographic images are stored lossy as JPEG (or WebP)
+    and line art / plots with few colours as an optimized, palette-reduced PNG.
+    """
     image = image.convert("RGB")
-    image.save(output_path, format="PNG")
-    return output_path
-
-
-def _extract_embedded_image(pdf_path: Path, output_path: Path, max_pages: int) -> Optional[Path]:
+    if options.max_width and image.width > options.max_width:
+        height = max(1, round(image.height * options.max_width / image.width))
+        image = image.resize((options.max_width, height), Image.LANCZOS)
+
+    requested = (options.format or "png").lower()
+    if requested in ("auto", "webp"):
+        if _is_photographic(image):
+            encoding = "WEBP" if requested == "webp" else "JPEG"
+        else:
+            encoding = "PNG"
+    else:
+        encoding = {"jpg": "JPEG", "jpeg": "JPEG", "webp": "WEBP"}.get(requested, "PNG")
+
+    path = output_path.with_suffix(_FORMAT_SUFFIXES[encoding])
+    if encoding == "PNG":
+        if requested != "png" and image.getcolors(maxcolors=256) is not None:
+            image = image.quantize(colors=256)
+        image.save(path, format="PNG", optimize=True)
+    elif encoding == "JPEG":
+        image.save(path, format="JPEG", quality=options.quality, optimize=True, progressive=True)
+    else:
+        image.save(path, format="WEBP", quality=options.quality, method=4)
+    return {"path": path, "width": image.width, "height": image.height}
+
+
+_MIN_FIGURE_SIDE = 200
+_MAX_FIGURE_ASPECT = 3.0
+
+
+def _image_xobjects(resources, key_prefix: Tuple[str, ...] = (), depth: int = 0):
+    """
+    Yield `(key, xobject)` for image XObjects in `resources`, descending into form XObjects.
+
+    Only the dictionaries are read; no stream is decoded. `key` matches `page.images` indexing.
+    """
+    try:
+        xobjects = resources["/XObject"].get_object()
+    except Exception:
+        return
+    for name, reference in xobjects.items():
+        try:
+            xobject = reference.get_object()
+            subtype = xobject.get("/Subtype")
+        except Exception:
+            continue
+        path = key_prefix + (name,)
+        if subtype == "/Image":
+            yield (path[0] if len(path) == 1 else path), xobject
+        elif subtype == "/Form" and depth < 2 and "/Resources" in xobject:
+            yield from _image_xobjects(xobject["/Resources"], path, depth + 1)
+
+
+def _figure_rank(width: int, height: int) -> float:
+    """
+    Larger images rank higher; banner- or strip-shaped ones (logos, rules) are heavily discounted.
+    """
+    if width < _MIN_FIGURE_SIDE or height < _MIN_FIGURE_SIDE:
+        return 0.0
+    aspect = max(width, height) / min(width, height)
+    return float(width * height) / (1.0 if aspect <= _MAX_FIGURE_ASPECT else aspect * aspect)
+
+
+def _extract_embedded_image(
+    pdf_path: Path,
+    output_path: Path,
+    max_pages: int,
+    options: ImageOptions = ImageOptions(),
+) -> Optional[Dict]:
+    """
+    Save the best embedded image on the first `max_pages` pages.
+
+    Candidates are ranked from the image dictionaries alone (Width/Height, skipping masks), and
+    only the winner's pixel data is decoded; if it fails to decode the next best is tried.
+    """
     if PdfReader is None:
         return None
 
@@ -71,25 +310,65 @@ def _extract_embedded_image(pdf_path: Path, output_path: Path, max_pages: int) -
     except Exception:
         return None
 
-    for page in reader.pages[:max_pages]:
-        images = getattr(page, "images", None) or []
-        for image_file in images:
+    candidates = []
+    seen = set()
+    for page_index, page in enumerate(reader.pages[:max_pages]):
+        try:
+            resources = page["/Resources"]
+        except Exception:
+            continue
+        for key, xobject in _image_xobjects(resources):
+            reference = getattr(xobject, "indirect_reference", None)
+            identity = (reference.idnum, reference.generation) if reference is not None else None
+            if identity is not None and identity in seen:
+                continue
+            seen.add(identity)
+            if xobject.get("/ImageMask"):
+                continue
             try:
-                image = Image.open(BytesIO(image_file.data))
-                width, height = image.size
-                if width < 200 or height < 200:
-                    continue
-                return _save_image(image, output_path)
-            except Exception:
+                rank = _figure_rank(int(xobject.get("/Width", 0)), int(xobject.get("/Height", 0)))
+            except (TypeError, ValueError):
                 continue
+            if rank > 0:
+                candidates.append((-rank, page_index, len(candidates), page, key))
+
+    for _, _, _, page, key in sorted(candidates, key=lambda item: item[:3]):
+        try:
+            image = page.images[key].image
+            if image is None:
+                image = Image.open(BytesIO(page.images[key].data))
+            return _save_image(image, output_path, options)
+        except Exception:
+            continue
     return None
 
 
-def _render_first_page_preview(pdf_path: Path, output_prefix: Path) -> Optional[Path]:
+def _render_first_page(pdf_path: Path, output_path: Path, options: ImageOptions) -> Optional[Image.Image]:
+    """
+    Render page 1 in this process with pypdfium2, so a worker renders any number of PDFs
+    without spawning anything. Where pypdfium2 is unavailable, a `pdftoppm -singlefile`
+    subprocess writes to `output_path` instead. None when neither is available.
+    """
+    if pypdfium2 is not None:
+        with _PDFIUM_LOCK:
+            document = pypdfium2.PdfDocument(str(pdf_path))
+            try:
+                page = document[0]
+                if options.preview_width:
+                    scale = options.preview_width / page.get_width()
+                else:
+                    scale = options.preview_dpi / 72
+                return page.render(scale=scale).to_pil()
+            finally:
+                document.close()
+
     pdftoppm = shutil.which("pdftoppm")
     if not pdftoppm:
         return None
-
+    if options.preview_width:
+        resolution = ["-scale-to-x", str(options.preview_width), "-scale-to-y", "-1"]
+    else:
+        resolution = ["-r", str(options.preview_dpi)]
     try:
         subprocess.run(
             [
@@ -98,25 +377,89 @@ def _render_first_page_preview(pdf_path: Path, output_prefix: Path) -> Optional[
                 "1",
                 "-l",
                 "1",
+                "-singlefile",
                 "-png",
+                *resolution,
                 str(pdf_path),
-                str(output_prefix),
+                str(output_path.with_suffix("")),
             ],
             check=True,
             capture_output=True,
             text=True,
         )
+        with Image.open(output_path) as image:
+            image.load()
+            return image
     except Exception:
         return None
-
-    return _find_preview_output(output_prefix)
+    finally:
+        output_path.unlink(missing_ok=True)
+
+
+_CROP_INK_LEVEL = 160
+_CROP_MIN_HEIGHT = 0.08
+_CROP_PADDING = 0.01
+
+
+def _ink_runs(rows: np.ndarray) -> Iterator[Tuple[int, int]]:
+    padded = np.concatenate(([False], rows, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(padded))
+    return zip(edges[::2], edges[1::2])
+
+
+def _figure_region(image: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Bounding box of the largest figure-like block on a rendered page, or None.
+
+    Text lines leave blank rows between them, while a figure (axes, frames, photos) keeps ink
+    on every row it spans. So the page is searched for the largest uninterrupted run of inked
+    rows at least `_CROP_MIN_HEIGHT` of the page tall, both across the full width (inked in
+    both halves) and within each column half.
+    """
+    ink = np.asarray(image.convert("L")) < _CROP_INK_LEVEL
+    height, width = ink.shape
+    left_rows = ink[:, : width // 2].any(axis=1)
+    right_rows = ink[:, width // 2 :].any(axis=1)
+    best: Optional[Tuple[int, Tuple[int, int, int, int]]] = None
+    for rows, left, right in (
+        (left_rows & right_rows, 0, width),
+        (left_rows, 0, width // 2),
+        (right_rows, width // 2, width),
+    ):
+        for top, bottom in _ink_runs(rows):
+            if bottom - top < _CROP_MIN_HEIGHT * height:
+                continue
+            columns = np.flatnonzero(ink[top:bottom, left:right].any(axis=0))
+            box = (left + int(columns[0]), int(top), left + int(columns[-1]) + 1, int(bottom))
+            area = (box[2] - box[0]) * (box[3] - box[1])
+            if best is None or area > best[0]:
+                best = (area, box)
+    if best is None:
+        return None
+    pad = round(_CROP_PADDING * height)
+    left, top, right, bottom = best[1]
+    return max(0, left - pad), max(0, top - pad), min(width, right + pad), min(height, bottom + pad)
+
+
+def _render_preview(pdf_path: Path, output_path: Path, options: ImageOptions) -> Optional[Dict]:
+    """
+    Render the first page (cropped to its main figure when `options.preview_crop` finds one)
+    and save it to `output_path`. Adds `render_seconds` and `cropped` to the saved figure.
+    """
+    started = time.perf_counter()
+    page = _render_first_page(pdf_path, output_path.with_name(f"{output_path.stem}-page.png"), options)
+    if page is None:
+        return None
+    region = _figure_region(page) if options.preview_crop else None
+    if region is not None:
+        page = page.crop(region)
+    saved = _save_image(page, output_path, options)
+    return {**saved, "render_seconds": time.perf_counter() - started, "cropped": region is not None}
 
 
-def _find_preview_output(output_prefix: Path) -> Optional[Path]:
-    candidates = sorted(output_prefix.parent.glob(f"{output_prefix.name}-*.png"))
-    if not candidates:
-        return None
-    return candidates[0]
+def _figure_paths(paper: Dict, assets_dir: Path) -> Tuple[Path, Path]:
+    stem = _slugify(paper.get("id") or paper.get("title") or "paper", "paper")
+    return assets_dir / f"{stem}.pdf", assets_dir / f"{stem}.png"
 
 
 def extract_representative_figure(
@@ -124,29 +467,51 @@ def extract_representative_figure(
     assets_dir: Path,
     max_pages: int = 3,
 ) -> Optional[Path]:
+    figure = _fetch_figure(paper, assets_dir, max_pages)
+    return figure["path"] if figure else None
+
+
+def _fetch_figure(
+    paper: Dict,
+    assets_dir: Path,
+    max_pages: int,
+    download: Callable[[str, Path], int] = _download_pdf,
+    options: ImageOptions = ImageOptions(),
+) -> Optional[Dict]:
     pdf_url = _pdf_url(paper)
     if not pdf_url:
         return None
 
-    stem = _slugify(paper.get("id") or paper.get("title") or "paper", "paper")
-    pdf_path = assets_dir / f"{stem}.pdf"
-    figure_path = assets_dir / f"{stem}.png"
-    preview_prefix = assets_dir / f"{stem}-preview"
+    pdf_path = _figure_paths(paper, assets_dir)[0]
+    try:
+        download(pdf_url, pdf_path)
+    except Exception:
+        if pdf_path.exists():
+            pdf_path.unlink()
+        return None
+    return _figure_from_pdf(paper, assets_dir, max_pages, options)
+
 
+def _figure_from_pdf(
+    paper: Dict,
+    assets_dir: Path,
+    max_pages: int,
+    options: ImageOptions = ImageOptions(),
+) -> Optional[Dict]:
+    """
+    Pick a figure from an already downloaded PDF and delete the PDF. Returns `{"path", "width",
+    "height", "source"}` with source "embedded" or "preview". CPU-bound; safe to run in a worker
+    process.
+    """
+    pdf_path, figure_path = _figure_paths(paper, assets_dir)
     try:
-        _download_pdf(pdf_url, pdf_path)
-        embedded = _extract_embedded_image(pdf_path, figure_path, max_pages=max_pages)
+        embedded = _extract_embedded_image(pdf_path, figure_path, max_pages=max_pages, options=options)
         if embedded:
-            return embedded
+            return {**embedded, "source": "embedded"}
 
-        preview = _render_first_page_preview(pdf_path, preview_prefix)
+        preview = _render_preview(pdf_path, figure_path, options)
         if preview:
-            if preview != figure_path:
-                preview.replace(figure_path)
-            for extra_preview in assets_dir.glob(f"{preview_prefix.name}-*.png"):
-                if extra_preview != figure_path and extra_preview.exists():
-                    extra_preview.unlink()
-            return figure_path
+            return {**preview, "source": "preview"}
     except Exception:
         return None
     finally:
@@ -156,22 +521,193 @@ def extract_representative_figure(
     return None
 
 
+def _pool_ready() -> bool:
+    return True
+
+
+def _extraction_pool(workers: int) -> Executor:
+    """
+    Process pool for figure extraction, or a thread pool where worker processes cannot start.
+
+    Workers are spawned rather than forked: by now the parent has loaded torch and its thread
+    pools, and forking a multithreaded process can deadlock the child. Workers start lazily,
+    so one round trip is made here to surface start-up failures.
+    """
+    pool = None
+    try:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        pool.submit(_pool_ready).result()
+        return pool
+    except Exception as exc:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        print(f"Figure extraction processes unavailable ({exc!r}); using threads.")
+        return ThreadPoolExecutor(max_workers=workers)
+
+
+def _completed(result) -> Future:
+    future: Future = Future()
+    future.set_result(result)
+    return future
+
+
+def _fetch_figures_concurrently(
+    papers: List[Dict],
+    assets_dir: Path,
+    max_pages: int,
+    download_workers: int,
+    per_host: int,
+    extract_workers: int,
+    download_pdf: Callable[[str, Path], int],
+    options: ImageOptions = ImageOptions(),
+) -> List[Optional[Dict]]:
+    """
+    Download PDFs on a thread pool (at most `per_host` at once per host) and hand each finished
+    download to a process pool for figure extraction. Results keep input order.
+    """
+    host_slot = _HostLimiter(per_host)
+    extract_workers = extract_workers or min(len(papers), os.cpu_count() or 1)
+    extractions: List[Optional[Future]] = [None] * len(papers)
+
+    with _extraction_pool(extract_workers) as extract_pool:
+
+        def download(index: int) -> None:
+            paper = papers[index]
+            pdf_url = _pdf_url(paper)
+            if not pdf_url:
+                return
+            pdf_path = _figure_paths(paper, assets_dir)[0]
+            try:
+                with host_slot(pdf_url):
+                    download_pdf(pdf_url, pdf_path)
+            except Exception:
+                if pdf_path.exists():
+                    pdf_path.unlink()
+                return
+            try:
+                extractions[index] = extract_pool.submit(_figure_from_pdf, paper, assets_dir, max_pages, options)
+            except Exception:
+                # A broken pool (e.g. a crashed worker) rejects new work; extract in this thread.
+                extractions[index] = _completed(_figure_from_pdf(paper, assets_dir, max_pages, options))
+
+        with ThreadPoolExecutor(max_workers=download_workers) as download_pool:
+            list(download_pool.map(download, range(len(papers))))
+
+        figures: List[Optional[Dict]] = []
+        for paper, future in zip(papers, extractions):
+            try:
+                figures.append(future.result() if future is not None else None)
+            except Exception:
+                # `_figure_from_pdf` handles its own errors, so this is the pool failing; retry here.
+                figures.append(_figure_from_pdf(paper, assets_dir, max_pages, options))
+    return figures
+
+
 def attach_figures(
     papers: Iterable[Dict],
     assets_dir: Path,
     enabled: bool = True,
     max_pages: int = 3,
+    download_workers: int = 1,
+    per_host: int = 2,
+    extract_workers: int = 0,
+    cache: Optional[FigureCache] = None,
+    max_pdf_bytes: int = 0,
+    pdf_cache_dir: Optional[Path] = None,
+    image_options: ImageOptions = ImageOptions(),
+    pdf_cache_max_bytes: int = 0,
 ) -> List[Dict]:
+    """
+    Attach a representative figure to each paper. With `download_workers` > 1, downloads run
+    concurrently and extraction runs in `extract_workers` processes (0 = one per CPU).
+
+    With a `cache`, arXiv papers whose figure was extracted on an earlier run (same version and
+    `max_pages`) are served from it without touching the network or the PDF. PDFs are streamed
+    to disk and skipped beyond `max_pdf_bytes`; the bytes transferred are kept in `pdf_bytes`.
+    PDFs kept in `pdf_cache_dir` are evicted least recently used beyond `pdf_cache_max_bytes`
+    once the downloads are done.
+    Figures are stored per `image_options`, and their size is kept in `figure_width` /
+    `figure_height` so publishers need not reopen them, with the file size in `figure_bytes`.
+    Freshly rendered previews also record `figure_render_seconds` and are reported per paper.
+    """
     assets_dir.mkdir(parents=True, exist_ok=True)
-    enriched: List[Dict] = []
-    for paper in papers:
-        item = dict(paper)
-        if enabled:
-            figure_path = extract_representative_figure(item, assets_dir, max_pages=max_pages)
-            if figure_path:
-                item["figure_path"] = str(figure_path)
-                item["figure_caption"] = "论文图像预览"
-        enriched.append(item)
+    enriched = [dict(paper) for paper in papers]
+    if not enabled:
+        return enriched
+
+    figures: List[Optional[Dict]] = [None] * len(enriched)
+    variant = image_options.variant()
+    keys = [FigureCache.key(item, max_pages, variant) if cache is not None else None for item in enriched]
+    missing: List[int] = []
+    for index, (item, key) in enumerate(zip(enriched, keys)):
+        entry = cache.get(key, _figure_paths(item, assets_dir)[1]) if cache is not None else None
+        if entry is not None:
+            figures[index] = entry
+        else:
+            missing.append(index)
+
+    to_fetch = [enriched[index] for index in missing]
+    transferred: Dict[Path, int] = {}
+    session = _pooled_session(max(1, download_workers))
+
+    def download_pdf(pdf_url: str, pdf_path: Path) -> int:
+        try:
+            size = _download_pdf(
+                pdf_url, pdf_path, session=session, max_bytes=max_pdf_bytes, cache_dir=pdf_cache_dir
+            )
+        except PdfTooLarge as exc:
+            print(f"Skipping figure: {exc}.")
+            raise
+        transferred[pdf_path] = size
+        return size
+
+    try:
+        if download_workers > 1 and len(to_fetch) > 1:
+            fetched = _fetch_figures_concurrently(
+                to_fetch,
+                assets_dir,
+                max_pages,
+                download_workers,
+                per_host,
+                extract_workers,
+                download_pdf,
+                image_options,
+            )
+        else:
+            fetched = [
+                _fetch_figure(item, assets_dir, max_pages, download=download_pdf, options=image_options)
+                for item in to_fetch
+            ]
+    finally:
+        session.close()
+    if pdf_cache_dir is not None:
+        _evict_pdf_cache(pdf_cache_dir, pdf_cache_max_bytes)
+    for item in to_fetch:
+        pdf_path = _figure_paths(item, assets_dir)[0]
+        if pdf_path in transferred:
+            item["pdf_bytes"] = transferred[pdf_path]
+    for index, figure in zip(missing, fetched):
+        figures[index] = figure
+        if figure is not None and cache is not None:
+            cache.put(keys[index], figure)
+    if cache is not None:
+        cache.flush()
+
+    for item, figure in zip(enriched, figures):
+        if figure:
+            item["figure_path"] = str(figure["path"])
+            item["figure_source"] = figure["source"]
+            item["figure_width"] = figure["width"]
+            item["figure_height"] = figure["height"]
+            item["figure_bytes"] = figure.get("bytes") or Path(figure["path"]).stat().st_size
+            item["figure_caption"] = "论文图像预览"
+            if "render_seconds" in figure:
+                item["figure_render_seconds"] = round(figure["render_seconds"], 3)
+                print(
+                    f"Rendered preview for {item.get('id') or item.get('title')}: "
+                    f"{figure['render_seconds']:.2f}s, {item['figure_bytes'] / 1024:.0f} KB, "
+                    f"{figure['width']}x{figure['height']}{' (cropped)' if figure.get('cropped') else ''}."
+                )
     return enriched
 
 
@@ -213,6 +749,9 @@ def build_markdown_digest(
         if link:
             lines.append(f"- 链接: {link}")
         lines.append(f"- 相关度: {score_text}")
+        interest = (paper.get("interest") or "").strip()
+        if interest:
+            lines.append(f"- 兴趣方向: {interest}")
 
         authors = _author_line(paper.get("authors") or [])
         if authors:
@@ -259,6 +798,14 @@ def generate_daily_digest(
     include_figures: bool = True,
     figure_pages: int = 3,
     generated_at: Optional[datetime] = None,
+    figure_download_workers: int = 1,
+    figure_per_host: int = 2,
+    figure_extract_workers: int = 0,
+    figure_cache: Optional[FigureCache] = None,
+    max_pdf_mb: float = 0,
+    pdf_cache_dir: Optional[str] = None,
+    image_options: ImageOptions = ImageOptions(),
+    pdf_cache_max_mb: float = 0,
 ) -> DigestArtifact:
     generated_at = generated_at or datetime.now()
     date_dir = generated_at.strftime("%Y-%m-%d")
@@ -271,6 +818,14 @@ def generate_daily_digest(
         assets_dir=assets_dir,
         enabled=include_figures,
         max_pages=figure_pages,
+        download_workers=figure_download_workers,
+        per_host=figure_per_host,
+        extract_workers=figure_extract_workers,
+        cache=figure_cache,
+        max_pdf_bytes=int(max_pdf_mb * 1024 * 1024),
+        pdf_cache_dir=Path(pdf_cache_dir) if pdf_cache_dir else None,
+        image_options=image_options,
+        pdf_cache_max_bytes=int(pdf_cache_max_mb * 1024 * 1024),
     )
 
     markdown_path = root / "daily_digest.md"
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+
+_NON_ALNUM_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk cache of corpus embeddings for one model.
+
+    Layout under `<root>/<model>/`:
+    - `embeddings.npy`: float32 matrix, opened with `mmap_mode="r"`
+    - `index.json`: model name, dimension and the content hash of each row
+    """
+
+    def __init__(self, root: str, model_name: str) -> None:
+        self.model_name = model_name
+        self.directory = Path(root) / (_NON_ALNUM_RE.sub("_", model_name).strip("_") or "model")
+        self.matrix_path = self.directory / "embeddings.npy"
+        self.index_path = self.directory / "index.json"
+        self._rows: Dict[str, int] = {}
+        self._matrix = None
+        self._load()
+
+    def _load(self) -> None:
+        if not self.index_path.exists() or not self.matrix_path.exists():
+            return
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+        except Exception as exc:
+            print(f"Ignoring unreadable embedding cache at {self.directory} ({exc}).")
+            return
+        hashes = index.get("hashes") or []
+        if index.get("model") != self.model_name or matrix.ndim != 2 or matrix.shape[0] != len(hashes):
+            return
+        self._rows = {digest: row for row, digest in enumerate(hashes)}
+        self._matrix = matrix
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _save(self, hashes: List[str], matrix: np.ndarray) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_matrix = self.matrix_path.with_suffix(".tmp.npy")
+        tmp_index = self.index_path.with_suffix(".tmp")
+        np.save(tmp_matrix, np.ascontiguousarray(matrix, dtype=np.float32))
+        tmp_index.write_text(
+            json.dumps({"model": self.model_name, "dim": int(matrix.shape[1]), "hashes": hashes}),
+            encoding="utf-8",
+        )
+        # Drop the mmap before replacing the file underneath it.
+        self._matrix = None
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_index, self.index_path)
+        self._rows = {digest: row for row, digest in enumerate(hashes)}
+        self._matrix = np.load(self.matrix_path, mmap_mode="r")
+
+    def encode(self, texts: Sequence[str], encode_fn: Callable[[Sequence[str]], np.ndarray]) -> np.ndarray:
+        """
+        Return embeddings for `texts`, encoding only texts that are not cached yet.
+
+        The store is then rewritten to hold exactly the current texts, so rows of items that
+        left the corpus are evicted.
+        """
+        hashes = [text_hash(text) for text in texts]
+        missing: Dict[str, str] = {}
+        for digest, text in zip(hashes, texts):
+            if digest not in self._rows and digest not in missing:
+                missing[digest] = text
+
+        if missing:
+            encoded = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+
+        unique_hashes = list(dict.fromkeys(hashes))
+        stale = len(self._rows) - (len(unique_hashes) - len(missing))
+        if not unique_hashes:
+            if stale and self._matrix is not None:
+                self._save([], np.zeros((0, self._matrix.shape[1]), dtype=np.float32))
+                print(f"Embedding cache: corpus is empty, {stale} evicted.")
+            return np.zeros((0, 0), dtype=np.float32)
+
+        if missing or stale:
+            dim = encoded.shape[1] if missing else self._matrix.shape[1]
+            matrix = np.empty((len(unique_hashes), dim), dtype=np.float32)
+            reused = [(row, self._rows[digest]) for row, digest in enumerate(unique_hashes) if digest not in missing]
+            if reused:
+                targets, sources = zip(*reused)
+                matrix[list(targets)] = self._matrix[list(sources)]
+            if missing:
+                positions = {digest: row for row, digest in enumerate(unique_hashes)}
+                matrix[[positions[digest] for digest in missing]] = encoded
+            self._save(unique_hashes, matrix)
+            print(
+                f"Embedding cache: {len(missing)} encoded, {len(unique_hashes) - len(missing)} reused, "
+                f"{stale} evicted."
+            )
+        else:
+            print(f"Embedding cache: all {len(unique_hashes)} corpus embeddings reused.")
+
+        if all(self._rows[digest] == row for row, digest in enumerate(hashes)):
+            # Rows are already stored in corpus order, so the memory map can be handed out as-is.
+            return self._matrix
+        return np.asarray(self._matrix[[self._rows[digest] for digest in hashes]])
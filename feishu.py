@@ -57,6 +57,9 @@ def _paper_md(idx: int, paper: Dict[str, str]) -> str:
         title_line,
         f"{stars}  相关度: {score_text}" + (f" | [{link_text[:-2]}]({link})" if link_text else ""),
     ]
+    interest = (paper.get("interest") or "").strip()
+    if interest:
+        lines.append(f"兴趣方向: {interest}")
     if author_line:
         lines.append(f"作者: {author_line}")
     if keywords:
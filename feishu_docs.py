@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from datetime import datetime
+import mimetypes
 from pathlib import Path
 import time
 from typing import Dict, Iterable, List, Optional
@@ -255,7 +256,7 @@ class FeishuDocsClient:
                     "parent_node": document_id,
                     "size": str(path.stat().st_size),
                 },
-                files={"file": (path.name, file_obj, "image/png")},
+                files={"file": (path.name, file_obj, mimetypes.guess_type(path.name)[0] or "image/png")},
             )
 
         data = payload.get("data", {})
@@ -354,6 +355,10 @@ class FeishuDocsClient:
             score_text = f"{score:.2f}" if isinstance(score, (int, float)) else "N/A"
             blocks.append(self._paragraph_block(f"相关度: {score_text}"))
 
+            interest = (paper.get("interest") or "").strip()
+            if interest:
+                blocks.append(self._paragraph_block(f"兴趣方向: {interest}"))
+
             authors = paper.get("authors") or []
             if authors:
                 blocks.append(self._paragraph_block("作者: " + ", ".join(authors[:8])))
@@ -383,8 +388,10 @@ class FeishuDocsClient:
 
             figure_path = paper.get("figure_path")
             if figure_path:
-                with Image.open(figure_path) as image:
-                    width, height = image.size
+                width, height = paper.get("figure_width"), paper.get("figure_height")
+                if not width or not height:
+                    with Image.open(figure_path) as image:
+                        width, height = image.size
                 blocks.append(self._image_block(figure_path, width, height))
 
         return blocks
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+
+_ARXIV_ID_RE = re.compile(r"(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/\d{7})(v\d+)?", re.IGNORECASE)
+
+
+def arxiv_version(paper: Dict) -> Optional[Tuple[str, str]]:
+    """
+    `(base id, version)` of an arXiv paper, e.g. `("2401.01234", "v2")`; the version comes from
+    the id or the abs/pdf link and is "" when neither carries one. None for non-arXiv papers.
+    """
+    base_id = ""
+    version = ""
+    for value in (paper.get("id"), paper.get("link"), paper.get("url")):
+        match = _ARXIV_ID_RE.search(value or "")
+        if not match:
+            continue
+        base_id = base_id or match.group(1)
+        if match.group(1) == base_id and match.group(2):
+            version = match.group(2)
+            break
+    return (base_id, version) if base_id else None
+
+
+class FigureCache:
+    """
+    Cross-run cache of the figure chosen for each arXiv paper.
+
+    Layout under `root`:
+    - `<key>.<png|jpg|webp>`: the figure
+    - `index.json`: per key the file suffix, width, height, source ("embedded" or "preview"),
+      size and last access time; entries are evicted least recently used once `max_bytes` is
+      exceeded.
+
+    Hits only update the access time in memory; the index is written by `put` or `flush`.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 200 * 1024 * 1024) -> None:
+        self.root = Path(root)
+        self.index_path = self.root / "index.json"
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._dirty = False
+        if self.index_path.exists():
+            try:
+                self._entries = json.loads(self.index_path.read_text(encoding="utf-8"))
+            except Exception as exc:
+                print(f"Ignoring unreadable figure cache index at {self.index_path} ({exc}).")
+
+    @staticmethod
+    def key(paper: Dict, figure_pages: int, variant: str = "") -> Optional[str]:
+        """
+        `variant` names how the figure was encoded, so changing image settings misses the cache.
+        """
+        version = arxiv_version(paper)
+        if version is None:
+            return None
+        base_id, suffix = version
+        key = f"{base_id.replace('/', '_')}{suffix or 'v0'}-p{int(figure_pages)}"
+        return f"{key}-{variant}" if variant else key
+
+    def _file(self, key: str, entry: Dict) -> Path:
+        return self.root / f"{key}{entry.get('suffix', '.png')}"
+
+    def _save_index(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._entries), encoding="utf-8")
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+
+    def flush(self) -> None:
+        """
+        Write the index if hits or stale entries changed it since the last write.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def get(self, key: Optional[str], destination: Path) -> Optional[Dict]:
+        """
+        Copy the cached figure for `key` next to `destination` (with the cached file's suffix) and
+        return its metadata including `path`, or None on a miss.
+        """
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._file(key, entry).exists():
+                if self._entries.pop(key, None) is not None:
+                    self._dirty = True
+                self.misses += 1
+                return None
+            path = destination.with_suffix(entry.get("suffix", ".png"))
+            shutil.copyfile(self._file(key, entry), path)
+            entry["accessed"] = time.time()
+            self.hits += 1
+            self._dirty = True
+            return {**entry, "path": path}
+
+    def put(self, key: Optional[str], figure: Dict) -> Optional[Dict]:
+        """
+        Store `figure` (`path`, `source` and optionally `width` / `height`) under `key`.
+        """
+        figure_path = Path(figure["path"])
+        if key is None or not figure_path.exists():
+            return None
+        width, height = figure.get("width"), figure.get("height")
+        if not width or not height:
+            try:
+                with Image.open(figure_path) as image:
+                    width, height = image.size
+            except Exception:
+                return None
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            entry = {
+                "suffix": figure_path.suffix,
+                "width": width,
+                "height": height,
+                "source": figure["source"],
+                "bytes": figure_path.stat().st_size,
+                "accessed": time.time(),
+            }
+            shutil.copyfile(figure_path, self._file(key, entry))
+            self._entries[key] = entry
+            self._evict()
+            self._save_index()
+            return dict(entry)
+
+    def _evict(self) -> None:
+        total = sum(entry["bytes"] for entry in self._entries.values())
+        for key in sorted(self._entries, key=lambda name: self._entries[name]["accessed"]):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries.pop(key)
+            total -= entry["bytes"]
+            self._file(key, entry).unlink(missing_ok=True)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ann_index import spherical_kmeans
+
+
+@dataclass
+class InterestProfile:
+    """
+    K interest centroids over the Zotero corpus plus each corpus item's cluster label.
+    """
+
+    centroids: np.ndarray
+    labels: np.ndarray
+
+    def score(self, cand_emb: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return `(scores, winners)`: each candidate's cosine to its closest centroid and that centroid's index.
+        """
+        sims = np.asarray(cand_emb, dtype=np.float32) @ self.centroids.T
+        winners = sims.argmax(axis=1)
+        return sims[np.arange(len(sims)), winners].astype(np.float64), winners
+
+    def describe(self, corpus: Sequence[Dict], top_n: int = 2) -> List[str]:
+        """
+        Name each cluster after the Zotero collections (or tags) most common among its members.
+        """
+        counters = [Counter() for _ in range(len(self.centroids))]
+        for paper, label in zip(corpus, self.labels.tolist()):
+            counters[label].update(paper.get("collections") or paper.get("tags") or [])
+        names: List[str] = []
+        for idx, counter in enumerate(counters):
+            common = [name for name, _ in counter.most_common(top_n) if name]
+            names.append(" / ".join(common) or f"Cluster {idx + 1}")
+        return names
+
+
+def _corpus_fingerprint(hashes: Sequence[str], k: int) -> str:
+    digest = hashlib.sha1(f"k={k}".encode("utf-8"))
+    for item_hash in hashes:
+        digest.update(item_hash.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def build_profile(
+    hashes: Sequence[str],
+    corpus_emb: np.ndarray,
+    k: int,
+    cache_dir: Optional[Path] = None,
+) -> InterestProfile:
+    """
+    Cluster the corpus embeddings into `k` centroids, reusing `cache_dir/profile.npz` while the
+    corpus (as identified by its ordered content hashes) is unchanged.
+    """
+    fingerprint = _corpus_fingerprint(hashes, k)
+    cache_path = cache_dir / "profile.npz" if cache_dir else None
+    if cache_path is not None and cache_path.exists():
+        try:
+            with np.load(cache_path, allow_pickle=False) as payload:
+                if str(payload["fingerprint"]) == fingerprint:
+                    return InterestProfile(centroids=payload["centroids"], labels=payload["labels"])
+        except Exception as exc:
+            print(f"Ignoring unreadable interest profile at {cache_path} ({exc}).")
+
+    centroids, labels = spherical_kmeans(corpus_emb, k)
+    profile = InterestProfile(centroids=centroids, labels=labels)
+    print(f"Interest profile built: {len(centroids)} clusters over {len(hashes)} Zotero items.")
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp.npz")
+        np.savez(tmp_path, fingerprint=np.asarray(fingerprint), centroids=centroids, labels=labels)
+        os.replace(tmp_path, cache_path)
+    return profile
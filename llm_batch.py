@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_limiter import TokenBudgetExceeded
+from llm_metrics import CallRecord
+from llm_utils import LLMScorer, estimate_request_tokens, is_json_object
+
+
+_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def build_batch_requests(
+    papers: List[Dict],
+    scorer: LLMScorer,
+    translate_lang: str = "Chinese",
+    tldr_lang: str = "Chinese",
+    max_words: int = 80,
+    translate: bool = True,
+    tldr: bool = True,
+) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+    """
+    One chat request per paper with an abstract, keyed by `custom_id`, for the fields wanted.
+
+    Returns the scorer method the requests belong to (`enrich` for TLDR plus translation,
+    `translate` or `summarize` for one of them) and the requests; none when neither is wanted.
+    """
+    if translate and tldr:
+        method = "enrich"
+    elif translate:
+        method = "translate"
+    elif tldr:
+        method = "summarize"
+    else:
+        return "", {}
+    requests: Dict[str, Dict[str, Any]] = {}
+    for index, paper in enumerate(papers):
+        if not paper.get("abstract"):
+            continue
+        title, abstract = paper.get("title", ""), paper["abstract"]
+        if method == "enrich":
+            request = scorer.enrich_request(
+                title, abstract, translate_lang=translate_lang, tldr_lang=tldr_lang, max_words=max_words
+            )
+        elif method == "translate":
+            request = scorer.translate_request(abstract, target_lang=translate_lang)
+        else:
+            request = scorer.summarize_request(title, abstract, target_lang=tldr_lang, max_words=max_words)
+        requests[f"paper-{index}"] = request
+    return method, requests
+
+
+def write_batch_file(path: Path, scorer: LLMScorer, requests: Dict[str, Dict[str, Any]]) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as handle:
+        for custom_id, request in requests.items():
+            line = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": scorer.model, "temperature": scorer.temperature, **request},
+            }
+            handle.write(json.dumps(line, ensure_ascii=False) + "\n")
+    return path
+
+
+def run_batch(
+    scorer: LLMScorer,
+    input_path: Path,
+    poll_seconds: float = 30.0,
+    timeout_seconds: float = 24 * 3600,
+    reserved_tokens: int = 0,
+) -> Dict[str, str]:
+    """
+    Upload `input_path`, create a chat-completions batch and poll until it finishes.
+
+    Returns message content by `custom_id` for the requests that succeeded; the raw output file
+    is kept next to the input. Returns what is available (possibly nothing) on failure or timeout.
+    Once the output is read, the `reserved_tokens` charged to the token budget are replaced by
+    the reported usage; a batch without output keeps its reservation, since the provider may
+    still bill requests it finished before a cancel.
+    """
+    client = scorer.client
+    with input_path.open("rb") as handle:
+        uploaded = client.files.create(file=handle, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    print(f"Submitted LLM batch {batch.id} ({input_path.name}).")
+
+    deadline = time.monotonic() + timeout_seconds
+    while batch.status not in _TERMINAL_STATUSES:
+        if time.monotonic() >= deadline:
+            print(f"LLM batch {batch.id} still {batch.status} after {timeout_seconds:.0f}s; cancelling.")
+            try:
+                client.batches.cancel(batch.id)
+            except Exception:
+                pass
+            return {}
+        time.sleep(poll_seconds)
+        try:
+            batch = client.batches.retrieve(batch.id)
+        except Exception as exc:
+            print(f"Polling LLM batch {batch.id} failed ({exc}); retrying.")
+    print(f"LLM batch {batch.id} finished with status {batch.status}.")
+    if not batch.output_file_id:
+        return {}
+
+    output = client.files.content(batch.output_file_id).text
+    input_path.with_suffix(".output.jsonl").write_text(output, encoding="utf-8")
+    contents: Dict[str, str] = {}
+    used_tokens = 0
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if response.get("status_code") != 200:
+                continue
+            body = response["body"]
+            contents[record["custom_id"]] = body["choices"][0]["message"]["content"] or ""
+            usage = body.get("usage") or {}
+            used_tokens += int(usage.get("total_tokens") or 0)
+            # Batch requests have no per-call latency; only their tokens are logged.
+            scorer.metrics.record(
+                CallRecord(
+                    method="enrich_batch_api",
+                    model=body.get("model") or scorer.model,
+                    outcome="ok",
+                    prompt_tokens=int(usage.get("prompt_tokens") or 0),
+                    completion_tokens=int(usage.get("completion_tokens") or 0),
+                    cached_tokens=int((usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0),
+                )
+            )
+        except Exception:
+            continue
+    scorer.limiter.settle(reserved_tokens, used_tokens)
+    return contents
+
+
+def batch_enrich(
+    papers: List[Dict],
+    scorer: LLMScorer,
+    work_dir: str,
+    translate_lang: str = "Chinese",
+    tldr_lang: str = "Chinese",
+    max_words: int = 80,
+    poll_seconds: float = 30.0,
+    timeout_seconds: float = 24 * 3600,
+    translate: bool = True,
+    tldr: bool = True,
+) -> List[Optional[Dict[str, str]]]:
+    """
+    Enrich `papers` through the provider's batch endpoint, requesting only the wanted fields.
+
+    Returns `{"tldr", "abstract_zh"}` (the wanted ones) per paper, or None where the batch gave
+    no usable answer (no abstract, failed request, bad output, batch over the token budget), so
+    the caller can finish those synchronously. Responses are read from and written to the
+    scorer's response cache under the same keys as the synchronous calls. The estimated tokens
+    of the whole batch are charged to the limiter's token budget before it is submitted.
+    """
+    method, requests = build_batch_requests(papers, scorer, translate_lang, tldr_lang, max_words, translate, tldr)
+    validate = is_json_object if method == "enrich" else (lambda content: bool(content.strip()))
+    contents: Dict[str, str] = {}
+    pending: Dict[str, Dict[str, Any]] = {}
+    for custom_id, request in requests.items():
+        cached = scorer.cache.get(scorer.cache_key(method, **request)) if scorer.cache is not None else None
+        if cached is not None:
+            contents[custom_id] = cached
+        else:
+            pending[custom_id] = request
+
+    if pending:
+        estimated = sum(estimate_request_tokens(request["messages"]) for request in pending.values())
+        try:
+            scorer.limiter.reserve(estimated)
+        except TokenBudgetExceeded as exc:
+            print(f"{exc} Enriching synchronously within the budget instead.")
+            pending = {}
+    if pending:
+        input_path = Path(work_dir) / f"{method}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl"
+        write_batch_file(input_path, scorer, pending)
+        try:
+            results = run_batch(
+                scorer,
+                input_path,
+                poll_seconds=poll_seconds,
+                timeout_seconds=timeout_seconds,
+                reserved_tokens=estimated,
+            )
+        except Exception as exc:
+            print(f"LLM batch submission failed ({exc}); falling back to synchronous calls.")
+            scorer.limiter.settle(estimated, 0)
+            results = {}
+        for custom_id, content in results.items():
+            if custom_id in pending and validate(content):
+                contents[custom_id] = content
+                if scorer.cache is not None:
+                    scorer.cache.put(scorer.cache_key(method, **pending[custom_id]), content)
+
+    enriched: List[Optional[Dict[str, str]]] = []
+    for index in range(len(papers)):
+        content = contents.get(f"paper-{index}")
+        if content is None or not validate(content):
+            enriched.append(None)
+        elif method == "enrich":
+            parsed = json.loads(content)
+            fields = {
+                "tldr": str(parsed.get("tldr") or "").strip(),
+                "abstract_zh": str(parsed.get("abstract_zh") or "").strip(),
+            }
+            enriched.append(fields if all(fields.values()) else None)
+        else:
+            enriched.append({"abstract_zh" if method == "translate" else "tldr": content.strip()})
+    return enriched
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import openai
+
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBudgetExceeded(RuntimeError):
+    """
+    Raised before a request once the run's token budget is spent; enrichment stops cleanly on it.
+    """
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `per_minute` units per minute.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self._tokens = self.capacity
+        self._rate = self.capacity / 60.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def acquire(self, amount: float) -> float:
+        """
+        Take `amount` units, sleeping until they are available. Returns the seconds waited.
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                delay = (amount - self._tokens) / self._rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount: float) -> None:
+        """
+        Debit (positive) or refund (negative) units once the real cost of a request is known.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+def _retry_after_seconds(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if not value:
+            continue
+        try:
+            return max(float(value) * scale, 0.0)
+        except ValueError:
+            continue
+    return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in _RETRYABLE_STATUS
+    return False
+
+
+class LLMRateLimiter:
+    """
+    Shared client-side limits for an `LLMScorer`: requests/tokens per minute, a per-run token
+    budget and jittered retries that honour `Retry-After`.
+
+    A zero limit disables that check. A `Retry-After` from one worker pauses all of them.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        token_budget: int = 0,
+        max_retries: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ) -> None:
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.token_budget = int(token_budget)
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+        self.tokens_used = 0
+        self.budget_exhausted = False
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+
+    def acquire(self, estimated_tokens: int) -> None:
+        """
+        Block until one request of about `estimated_tokens` fits the limits.
+
+        Raises `TokenBudgetExceeded` if it would overrun the run's token budget.
+        """
+        with self._lock:
+            if self.token_budget and (self.budget_exhausted or self.tokens_used + estimated_tokens > self.token_budget):
+                self.budget_exhausted = True
+                raise TokenBudgetExceeded(
+                    f"LLM token budget of {self.token_budget} reached ({self.tokens_used} tokens used)."
+                )
+        waited = 0.0
+        while True:
+            with self._lock:
+                remaining = self._paused_until - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(remaining)
+            waited += remaining
+        if self.requests is not None:
+            waited += self.requests.acquire(1)
+        if self.tokens is not None:
+            waited += self.tokens.acquire(estimated_tokens)
+        if waited:
+            with self._lock:
+                self.throttled_seconds += waited
+
+    def reserve(self, estimated_tokens: int) -> None:
+        """
+        Charge an offline batch of about `estimated_tokens` to the token budget before it is submitted.
+
+        Batch requests are queued by the provider, so the per-minute limits do not apply, but the
+        budget does. Raises `TokenBudgetExceeded` if the whole batch does not fit; unlike `acquire`,
+        this leaves the budget open for smaller synchronous calls.
+        """
+        with self._lock:
+            if self.token_budget and (self.budget_exhausted or self.tokens_used + estimated_tokens > self.token_budget):
+                raise TokenBudgetExceeded(
+                    f"LLM batch of ~{estimated_tokens} tokens exceeds the token budget of {self.token_budget} "
+                    f"({self.tokens_used} tokens used)."
+                )
+            self.tokens_used += int(estimated_tokens)
+
+    def settle(self, reserved_tokens: int, actual_tokens: int) -> None:
+        """
+        Replace a `reserve`d estimate by the tokens the batch actually used.
+        """
+        with self._lock:
+            self.tokens_used += int(actual_tokens) - int(reserved_tokens)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        used = estimated_tokens if actual_tokens is None else int(actual_tokens)
+        if self.tokens is not None:
+            self.tokens.adjust(used - estimated_tokens)
+        with self._lock:
+            self.tokens_used += used
+
+    def retry_delay(self, attempt: int, exc: Exception) -> Optional[float]:
+        """
+        Seconds to wait before retry number `attempt + 1`, or None if `exc` should not be retried.
+
+        Only a server-sent `Retry-After` pauses every worker; plain backoff is left to the caller.
+        """
+        if attempt >= self.max_retries or not is_retryable(exc):
+            with self._lock:
+                self.failures += 1
+            return None
+        retry_after = _retry_after_seconds(exc)
+        if retry_after is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        else:
+            delay = min(retry_after, self.max_delay) + random.uniform(0, self.base_delay)
+        with self._lock:
+            self.retries += 1
+            self.throttled_seconds += delay
+            if retry_after is not None:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled_seconds": round(self.throttled_seconds, 2),
+                "tokens_used": self.tokens_used,
+                "budget_exhausted": self.budget_exhausted,
+            }
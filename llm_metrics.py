@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+import json
+from pathlib import Path
+import threading
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class CallRecord:
+    method: str
+    model: str
+    outcome: str  # "ok", "invalid" (empty or failed validation), "cache_hit", "error" or "budget"
+    latency: Optional[float] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    retries: int = 0
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class LLMMetrics:
+    """
+    Thread-safe log of every LLM call made during a run, with per-method aggregates.
+
+    Prices are in currency units per million tokens; cached prompt tokens fall back to the
+    input price when no cached price is given.
+    """
+
+    def __init__(
+        self,
+        input_price: float = 0.0,
+        output_price: float = 0.0,
+        cached_input_price: Optional[float] = None,
+    ) -> None:
+        self.input_price = float(input_price)
+        self.output_price = float(output_price)
+        self.cached_input_price = float(input_price if cached_input_price is None else cached_input_price)
+        self.records: List[CallRecord] = []
+        self._lock = threading.Lock()
+
+    def record(self, record: CallRecord) -> None:
+        with self._lock:
+            self.records.append(record)
+
+    def cost(self, prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> float:
+        return (
+            (prompt_tokens - cached_tokens) * self.input_price
+            + cached_tokens * self.cached_input_price
+            + completion_tokens * self.output_price
+        ) / 1_000_000
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-method call counts by outcome, retries, token totals, p50/p95/max latency and cost.
+        """
+        with self._lock:
+            records = list(self.records)
+        by_method: Dict[str, List[CallRecord]] = {}
+        for record in records:
+            by_method.setdefault(record.method, []).append(record)
+
+        summary: Dict[str, Dict[str, Any]] = {}
+        for method, items in by_method.items():
+            latencies = [
+                item.latency for item in items if item.latency is not None and item.outcome not in ("cache_hit", "budget")
+            ]
+            outcomes: Dict[str, int] = {}
+            for item in items:
+                outcomes[item.outcome] = outcomes.get(item.outcome, 0) + 1
+            prompt_tokens = sum(item.prompt_tokens for item in items)
+            completion_tokens = sum(item.completion_tokens for item in items)
+            cached_tokens = sum(item.cached_tokens for item in items)
+            summary[method] = {
+                "calls": len(items),
+                "outcomes": outcomes,
+                "retries": sum(item.retries for item in items),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cached_tokens": cached_tokens,
+                "latency_p50": round(_percentile(latencies, 0.5), 3) if latencies else None,
+                "latency_p95": round(_percentile(latencies, 0.95), 3) if latencies else None,
+                "latency_max": round(max(latencies), 3) if latencies else None,
+                "latency_total": round(sum(latencies), 3),
+                "estimated_cost": round(self.cost(prompt_tokens, completion_tokens, cached_tokens), 6),
+            }
+        return summary
+
+    def write_report(self, path: Path, extra: Optional[Dict[str, Any]] = None) -> Path:
+        """
+        Write the per-method summary, run totals and every call record as JSON.
+        """
+        summary = self.summary()
+        with self._lock:
+            records = [asdict(record) for record in self.records]
+        totals = {
+            "calls": len(records),
+            "prompt_tokens": sum(item["prompt_tokens"] for item in records),
+            "completion_tokens": sum(item["completion_tokens"] for item in records),
+            "cached_tokens": sum(item["cached_tokens"] for item in records),
+            "retries": sum(item["retries"] for item in records),
+            "estimated_cost": round(sum(item["estimated_cost"] for item in summary.values()), 6),
+        }
+        report = {
+            "prices_per_million": {
+                "input": self.input_price,
+                "cached_input": self.cached_input_price,
+                "output": self.output_price,
+            },
+            "totals": totals,
+            "methods": summary,
+            **(extra or {}),
+            "calls": records,
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
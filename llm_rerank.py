@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from llm_limiter import TokenBudgetExceeded
+from llm_utils import LLMScorer
+
+
+def build_profile_text(corpus: Sequence[Dict], max_terms: int = 20) -> str:
+    """
+    Describe the reader's interests by the Zotero collections and tags used most often in the corpus.
+
+    Libraries without collections or tags are described by their first `max_terms` titles
+    instead; "" only for an empty library.
+    """
+    collections = Counter(name for paper in corpus for name in paper.get("collections") or [] if name)
+    tags = Counter(name for paper in corpus for name in paper.get("tags") or [] if name)
+    parts = []
+    if collections:
+        parts.append("Zotero 集合: " + ", ".join(name for name, _ in collections.most_common(max_terms)))
+    if tags:
+        parts.append("常用标签: " + ", ".join(name for name, _ in tags.most_common(max_terms)))
+    if not parts:
+        titles = [(paper.get("title") or "").strip() for paper in corpus]
+        titles = [title for title in titles if title][:max_terms]
+        if titles:
+            parts.append("Zotero 论文标题: " + "; ".join(titles))
+    return "；".join(parts)
+
+
+def profile_hash(profile: str) -> str:
+    return hashlib.sha1(profile.encode("utf-8")).hexdigest()[:16]
+
+
+class RerankScoreStore:
+    """
+    LLM relevance scores keyed by (model, paper id, profile hash), kept in one JSON file.
+
+    Independent of the LLM response cache, so scores are reused across runs (and within a run)
+    even when `llm.cache_path` is unset. Entries expire after `ttl_seconds`; the oldest are
+    dropped beyond `max_entries`. `path=None` keeps the scores in memory only.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, max_entries: int = 5000, ttl_seconds: float = 14 * 86400
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        if self.path is not None and self.path.exists():
+            try:
+                self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except Exception as exc:
+                print(f"Ignoring unreadable rerank score cache at {self.path} ({exc}).")
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry["created"] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(entry["result"])
+
+    def put(self, key: str, result: Dict) -> None:
+        with self._lock:
+            self._entries[key] = {"result": result, "created": time.time()}
+            if len(self._entries) > self.max_entries:
+                oldest = sorted(self._entries, key=lambda name: self._entries[name]["created"])
+                for name in oldest[: len(self._entries) - self.max_entries]:
+                    del self._entries[name]
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self._entries, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+
+def _normalize(values: List[float]) -> List[float]:
+    low, high = min(values), max(values)
+    if high - low < 1e-9:
+        return [1.0 for _ in values]
+    return [(value - low) / (high - low) for value in values]
+
+
+def llm_rerank(
+    candidates: List[Dict],
+    scorer: LLMScorer,
+    profile: str,
+    top_k: int,
+    weight: float = 0.5,
+    concurrency: int = 4,
+    confident_score: float = 0.8,
+    store: Optional[RerankScoreStore] = None,
+) -> List[Dict]:
+    """
+    Rescore an embedding shortlist with the LLM and return the top `top_k` by blended score.
+
+    `candidates` must be sorted by embedding `score`. They are scored in that order, `concurrency`
+    at a time, and scoring stops early once `top_k` papers reach `confident_score`. The final
+    `score` is `(1 - weight) * normalized embedding score + weight * LLM score`; papers left
+    unscored (or whose call failed) keep the normalized embedding score. The inputs are kept as
+    `embedding_score`, `llm_score` and `llm_reason`. LLM scores are kept in `store` per (paper id,
+    profile hash) and saved after scoring; the scorer's response cache is bypassed for them.
+    """
+    if not candidates:
+        return []
+    profile_key = profile_hash(profile)
+    store = store if store is not None else RerankScoreStore()
+    results: List[Optional[Dict]] = [None] * len(candidates)
+
+    def cache_key(paper: Dict) -> str:
+        paper_id = paper.get("id") or paper.get("link") or paper.get("title") or ""
+        return f"rerank|{scorer.model}|{paper_id}|{profile_key}"
+
+    def score(paper: Dict) -> Optional[Dict]:
+        key = cache_key(paper)
+        cached = store.get(key)
+        if cached is not None:
+            return cached
+        try:
+            result = scorer.score(paper, profile, use_cache=False)
+        except TokenBudgetExceeded:
+            raise
+        except Exception:
+            return None
+        if result.get("error"):
+            return None
+        store.put(key, result)
+        return result
+
+    wave = max(1, concurrency)
+    scored = 0
+    with ThreadPoolExecutor(max_workers=wave) as pool:
+        for start in range(0, len(candidates), wave):
+            futures = [pool.submit(score, paper) for paper in candidates[start : start + wave]]
+            budget_spent = False
+            for offset, future in enumerate(futures):
+                # Keep the scores that finished even if another call in the wave hit the budget.
+                try:
+                    results[start + offset] = future.result()
+                except TokenBudgetExceeded:
+                    budget_spent = True
+            scored = start + len(futures)
+            if budget_spent:
+                print("LLM token budget reached during rerank; keeping embedding scores for the rest.")
+                break
+            confident = sum(
+                1 for result in results if result and result.get("match") and result["score"] >= confident_score
+            )
+            if confident >= top_k:
+                break
+    store.save()
+    if scored < len(candidates):
+        print(f"LLM rerank stopped early after {scored}/{len(candidates)} candidates.")
+    print(f"LLM rerank scores: {store.hits} cached, {store.misses} requested.")
+
+    embedding_scores = _normalize([float(paper.get("score", 0.0)) for paper in candidates])
+    reranked: List[Dict] = []
+    for paper, embedding_score, result in zip(candidates, embedding_scores, results):
+        llm_score = float(result["score"]) if result else None
+        item = {
+            **paper,
+            "embedding_score": paper.get("score"),
+            "llm_score": llm_score,
+            "score": embedding_score if llm_score is None else (1.0 - weight) * embedding_score + weight * llm_score,
+        }
+        if result and result.get("reason"):
+            item["llm_reason"] = result["reason"]
+        reranked.append(item)
+    reranked.sort(key=lambda item: item["score"], reverse=True)
+    return reranked[:top_k]
@@ -1,35 +1,199 @@
 import json
-from typing import Any, Dict
+import time
+from typing import Any, Callable, Dict, List, Optional
 
 from openai import OpenAI
 
+from llm_cache import LLMResponseCache, cache_key
+from llm_limiter import LLMRateLimiter, TokenBudgetExceeded
+from llm_metrics import CallRecord, LLMMetrics
+
+
+def is_json_object(content: str) -> bool:
+    try:
+        return isinstance(json.loads(content), dict)
+    except Exception:
+        return False
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English, 1 per CJK character).
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff")
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_request_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Estimated total tokens of one chat request; completions are assumed to be about as long as
+    the prompt (translations dominate).
+    """
+    return 2 * sum(estimate_tokens(message["content"]) for message in messages)
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut `text` to about `max_tokens` estimated tokens, preferring a sentence boundary.
+    """
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low]
+    boundary = max(cut.rfind(". "), cut.rfind("。"))
+    if boundary > len(cut) // 2:
+        cut = cut[: boundary + 1]
+    return cut.rstrip() + " …"
+
+
+def pack_batches(items: List[Dict[str, Any]], max_items: int, max_input_tokens: int) -> List[List[Dict[str, Any]]]:
+    """
+    Greedily pack papers into batches of at most `max_items` papers and `max_input_tokens` estimated
+    input tokens. A single paper over the budget still gets a batch of its own.
+    """
+    batches: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    current_tokens = 0
+    for item in items:
+        tokens = estimate_tokens(item.get("title") or "") + estimate_tokens(item.get("abstract") or "")
+        if current and (len(current) >= max_items or current_tokens + tokens > max_input_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
 
 class LLMScorer:
     """
     Small helper that scores Zotero papers against a free-form query using an OpenAI-compatible API.
     """
 
-    def __init__(self, api_key: str, base_url: str, model: str, temperature: float = 0.0):
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        model: str,
+        temperature: float = 0.0,
+        cache: Optional[LLMResponseCache] = None,
+        limiter: Optional[LLMRateLimiter] = None,
+        max_abstract_tokens: int = 0,
+        metrics: Optional[LLMMetrics] = None,
+    ):
+        # Retries are handled by the limiter so they share its backoff and counters.
+        self.client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
         self.model = model
         self.temperature = temperature
+        self.cache = cache
+        self.limiter = limiter or LLMRateLimiter()
+        self.max_abstract_tokens = int(max_abstract_tokens)
+        self.metrics = metrics or LLMMetrics()
+
+    def _chat(
+        self,
+        method: str,
+        messages: List[Dict[str, str]],
+        validate: Optional[Callable[[str], bool]] = None,
+        use_cache: bool = True,
+        **kwargs,
+    ) -> str:
+        """
+        Run one chat completion and return its message content, logging the call in `self.metrics`.
+
+        With a response cache (and `use_cache`), identical requests are answered from disk. Only non-empty
+        responses that pass `validate` are stored, so failures are retried on the next run.
+        Rate limits, retries and the token budget are enforced by `self.limiter`; raises
+        `TokenBudgetExceeded` once the budget is spent.
+        """
+        key = None
+        if self.cache is not None and use_cache:
+            key = self.cache_key(method, messages, **kwargs)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.metrics.record(CallRecord(method=method, model=self.model, outcome="cache_hit"))
+                return cached
+
+        estimated = estimate_request_tokens(messages)
+        record = CallRecord(method=method, model=self.model, outcome="error")
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    self.limiter.acquire(estimated)
+                except TokenBudgetExceeded:
+                    record.outcome = "budget"
+                    raise
+                try:
+                    response = self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        **kwargs,
+                    )
+                    break
+                except Exception as exc:
+                    self.limiter.record_usage(estimated, 0)
+                    delay = self.limiter.retry_delay(record.retries, exc)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    record.retries += 1
+
+            usage = getattr(response, "usage", None)
+            self.limiter.record_usage(estimated, getattr(usage, "total_tokens", None))
+            if usage is not None:
+                details = getattr(usage, "prompt_tokens_details", None)
+                record.prompt_tokens = int(getattr(usage, "prompt_tokens", 0) or 0)
+                record.completion_tokens = int(getattr(usage, "completion_tokens", 0) or 0)
+                record.cached_tokens = int(getattr(details, "cached_tokens", 0) or 0)
+
+            content = response.choices[0].message.content or ""
+            valid = bool(content.strip()) and (validate is None or validate(content))
+            record.outcome = "ok" if valid else "invalid"
+            if key is not None and valid:
+                self.cache.put(key, content)
+            return content
+        finally:
+            record.latency = time.perf_counter() - start
+            self.metrics.record(record)
+
+    def cache_key(self, method: str, messages: List[Dict[str, str]], **kwargs) -> str:
+        return cache_key(self.model, self.temperature, method, {"messages": messages, **kwargs})
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self.cache.stats() if self.cache is not None else {}
+
+    def _trim(self, abstract: str) -> str:
+        """
+        Trim an abstract used as context (scoring, TLDR). Text to be translated is never trimmed,
+        or `abstract_zh` would be the translation of a truncated abstract.
+        """
+        return trim_to_tokens(abstract, self.max_abstract_tokens)
 
-    def score(self, paper: Dict[str, Any], query: str) -> Dict[str, Any]:
+    def score(self, paper: Dict[str, Any], query: str, use_cache: bool = True) -> Dict[str, Any]:
         """
-        Score a single paper. Returns a dict with `match` (bool), `score` (float), `reason` (str).
+        Score a single paper. Returns a dict with `match` (bool), `score` (float), `reason` (str);
+        an unparseable response also sets `error`. `use_cache=False` bypasses the response cache
+        for callers that keep their own.
         """
-        summary = paper.get("abstract") or ""
+        summary = self._trim(paper.get("abstract") or "")
         title = paper.get("title") or "Untitled"
         collections = ", ".join(paper.get("collections") or []) or "N/A"
         tags = ", ".join(paper.get("tags") or []) or "N/A"
-        prompt = (
+        # Stable instructions first and the per-paper payload last, so provider prefix caching hits.
+        instructions = (
+            "Rate how relevant a paper is to the user request. Keep output as JSON only.\n"
             "你是资深学术助手，需评估一篇论文与用户需求的相关性，并给出简短理由。\n"
-            f"用户需求: {query}\n"
-            "论文元信息：\n"
-            f"- 标题: {title}\n"
-            f"- 摘要: {summary}\n"
-            f"- 标签: {tags}\n"
-            f"- 集合: {collections}\n\n"
             "输出严格的 JSON（仅一行）：\n"
             '{"match": true/false, "score": 0.00, "reason": "中文理由，≤30字"}\n'
             "规则：\n"
@@ -37,21 +201,26 @@ class LLMScorer:
             "- 关注主题/方法/应用场景的匹配度，避免仅凭关键词。\n"
             "- reason 只写核心匹配/不匹配点，不要多余前后缀。"
         )
+        prompt = (
+            f"用户需求: {query}\n"
+            "论文元信息：\n"
+            f"- 标题: {title}\n"
+            f"- 摘要: {summary}\n"
+            f"- 标签: {tags}\n"
+            f"- 集合: {collections}"
+        )
 
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "Rate how relevant a paper is to the user request. Keep output as JSON only.",
-                },
+        content = self._chat(
+            "score",
+            [
+                {"role": "system", "content": instructions},
                 {"role": "user", "content": prompt},
             ],
-            temperature=self.temperature,
             response_format={"type": "json_object"},
+            validate=is_json_object,
+            use_cache=use_cache,
         )
 
-        content = response.choices[0].message.content
         try:
             parsed = json.loads(content)
             parsed["score"] = float(parsed.get("score", 0.0))
@@ -60,7 +229,7 @@ class LLMScorer:
             return parsed
         except Exception:
             # Fall back to a conservative default when parsing fails
-            return {"match": False, "score": 0.0, "reason": "Failed to parse LLM response"}
+            return {"match": False, "score": 0.0, "reason": "Failed to parse LLM response", "error": True}
 
     def translate(self, text: str, target_lang: str = "Chinese") -> str:
         """
@@ -68,19 +237,11 @@ class LLMScorer:
         """
         if not text:
             return ""
-        prompt = (
-            f"请将以下摘要翻译为{target_lang}，直译为主，保持术语准确，避免添加说明，直接输出译文：\n\n{text}"
-        )
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a concise scientific translator."},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=self.temperature,
-            )
-            return response.choices[0].message.content.strip()
+            content = self._chat("translate", **self.translate_request(text, target_lang))
+            return content.strip()
+        except TokenBudgetExceeded:
+            raise
         except Exception:
             return ""
 
@@ -90,20 +251,231 @@ class LLMScorer:
         """
         if not abstract:
             return ""
-        prompt = (
-            f"用{target_lang}写一个精炼 TLDR（约{max_words}词），突出任务、方法、关键贡献与主要结果，避免口水话：\n"
-            f"标题: {title}\n"
-            f"摘要: {abstract}"
+        try:
+            content = self._chat("summarize", **self.summarize_request(title, abstract, target_lang, max_words))
+            return content.strip()
+        except TokenBudgetExceeded:
+            raise
+        except Exception:
+            return ""
+
+    def translate_request(self, text: str, target_lang: str = "Chinese") -> Dict[str, Any]:
+        """
+        Chat-completion arguments of the plain-text translation call; `text` is sent in full.
+        """
+        instructions = (
+            "You are a concise scientific translator.\n"
+            f"请将用户给出的摘要翻译为{target_lang}，直译为主，保持术语准确，避免添加说明，直接输出译文。"
+        )
+        return {
+            "messages": [
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": text},
+            ]
+        }
+
+    def summarize_request(
+        self, title: str, abstract: str, target_lang: str = "Chinese", max_words: int = 80
+    ) -> Dict[str, Any]:
+        """
+        Chat-completion arguments of the plain-text TLDR call, with the abstract trimmed.
+        """
+        instructions = (
+            "You are a sharp academic summarizer.\n"
+            f"用{target_lang}为用户给出的论文写一个精炼 TLDR（约{max_words}词），突出任务、方法、关键贡献与主要结果，避免口水话。"
+        )
+        return {
+            "messages": [
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": f"标题: {title}\n摘要: {self._trim(abstract)}"},
+            ]
+        }
+
+    def enrich(
+        self,
+        title: str,
+        abstract: str,
+        translate_lang: str = "Chinese",
+        tldr_lang: str = "Chinese",
+        max_words: int = 80,
+    ) -> Dict[str, str]:
+        """
+        Produce the TLDR and the abstract translation in one JSON-mode call.
+
+        Returns `{"tldr": ..., "abstract_zh": ...}`. If the response is not valid JSON or a field
+        is missing, that field is regenerated through `summarize` / `translate`.
+        """
+        if not abstract:
+            return {"tldr": "", "abstract_zh": ""}
+        parsed: Dict[str, Any] = {}
+        try:
+            content = self._chat(
+                "enrich",
+                **self.enrich_request(title, abstract, translate_lang, tldr_lang, max_words),
+                validate=is_json_object,
+            )
+            parsed = json.loads(content)
+            if not isinstance(parsed, dict):
+                parsed = {}
+        except TokenBudgetExceeded:
+            raise
+        except Exception:
+            parsed = {}
+        return self.complete_enrichment(parsed, title, abstract, translate_lang, tldr_lang, max_words)
+
+    def enrich_request(
+        self,
+        title: str,
+        abstract: str,
+        translate_lang: str = "Chinese",
+        tldr_lang: str = "Chinese",
+        max_words: int = 80,
+    ) -> Dict[str, Any]:
+        """
+        Chat-completion arguments (`messages`, `response_format`) of the combined TLDR/translation call.
+
+        The abstract is sent in full because it is also translated.
+        """
+        instructions = (
+            "You are a sharp academic summarizer and concise scientific translator. Reply with JSON only.\n"
+            "阅读用户给出的论文，输出严格的 JSON："
+            '{"tldr": "...", "abstract_zh": "..."}\n'
+            f"- tldr: 用{tldr_lang}写一个精炼 TLDR（约{max_words}词），突出任务、方法、关键贡献与主要结果，避免口水话。\n"
+            f"- abstract_zh: 将摘要翻译为{translate_lang}，直译为主，保持术语准确，避免添加说明。"
+        )
+        return {
+            "messages": [
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": f"标题: {title}\n摘要: {abstract}"},
+            ],
+            "response_format": {"type": "json_object"},
+        }
+
+    def complete_enrichment(
+        self,
+        parsed: Dict[str, Any],
+        title: str,
+        abstract: str,
+        translate_lang: str = "Chinese",
+        tldr_lang: str = "Chinese",
+        max_words: int = 80,
+    ) -> Dict[str, str]:
+        """
+        Take `tldr` / `abstract_zh` from a parsed enrich response, regenerating any missing field.
+        """
+        tldr = str(parsed.get("tldr") or "").strip()
+        abstract_zh = str(parsed.get("abstract_zh") or "").strip()
+        if not tldr:
+            tldr = self.summarize(title=title, abstract=abstract, target_lang=tldr_lang, max_words=max_words)
+        if not abstract_zh:
+            abstract_zh = self.translate(abstract, target_lang=translate_lang)
+        return {"tldr": tldr, "abstract_zh": abstract_zh}
+
+    def enrich_batch(
+        self,
+        papers: List[Dict[str, Any]],
+        translate_lang: str = "Chinese",
+        tldr_lang: str = "Chinese",
+        max_words: int = 80,
+        translate: bool = True,
+        tldr: bool = True,
+    ) -> List[Dict[str, str]]:
+        """
+        Enrich several papers with one JSON-mode request; results are returned in input order.
+
+        Items are matched back by a per-request id. When the response does not parse or misses
+        any item, the batch is split in half and each half retried, down to single papers, which
+        go through `enrich` / `summarize` / `translate`.
+        """
+        fields = [name for name, wanted in (("tldr", tldr), ("abstract_zh", translate)) if wanted]
+        if not papers or not fields:
+            return [{} for _ in papers]
+        if len(papers) == 1:
+            return [self._enrich_one(papers[0], translate_lang, tldr_lang, max_words, translate, tldr)]
+
+        ids = [str(index) for index in range(1, len(papers) + 1)]
+        field_rules = []
+        if tldr:
+            field_rules.append(
+                f"- tldr: 用{tldr_lang}写一个精炼 TLDR（约{max_words}词），突出任务、方法、关键贡献与主要结果，避免口水话。"
+            )
+        if translate:
+            field_rules.append(f"- abstract_zh: 将摘要翻译为{translate_lang}，直译为主，保持术语准确，避免添加说明。")
+        item_schema = ", ".join(['"id": "..."'] + [f'"{name}": "..."' for name in fields])
+        payload = json.dumps(
+            [
+                {
+                    "id": paper_id,
+                    "title": paper.get("title") or "",
+                    # Translated abstracts must be complete; TLDR-only batches can use the trimmed one.
+                    "abstract": (paper.get("abstract") or "") if translate else self._trim(paper.get("abstract") or ""),
+                }
+                for paper_id, paper in zip(ids, papers)
+            ],
+            ensure_ascii=False,
+        )
+        instructions = "\n".join(
+            [
+                "You are a sharp academic summarizer and concise scientific translator. Reply with JSON only.",
+                "用户会给出若干篇论文（JSON 数组）。为每篇论文输出一项，保留原 id，输出严格的 JSON："
+                f'{{"papers": [{{{item_schema}}}, ...]}}',
+            ]
+            + field_rules
         )
+
+        def parse(content: str) -> Dict[str, Dict[str, str]]:
+            parsed = json.loads(content)
+            results: Dict[str, Dict[str, str]] = {}
+            for entry in parsed.get("papers") or []:
+                if not isinstance(entry, dict):
+                    continue
+                values = {name: str(entry.get(name) or "").strip() for name in fields}
+                if all(values.values()):
+                    results[str(entry.get("id"))] = values
+            return results
+
+        def complete(content: str) -> bool:
+            try:
+                return all(paper_id in parse(content) for paper_id in ids)
+            except Exception:
+                return False
+
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a sharp academic summarizer."},
-                    {"role": "user", "content": prompt},
+            content = self._chat(
+                "enrich_batch",
+                [
+                    {"role": "system", "content": instructions},
+                    {"role": "user", "content": f"论文:\n{payload}"},
                 ],
-                temperature=self.temperature,
+                response_format={"type": "json_object"},
+                validate=complete,
             )
-            return response.choices[0].message.content.strip()
+            results = parse(content)
+        except TokenBudgetExceeded:
+            raise
         except Exception:
-            return ""
+            results = {}
+
+        if all(paper_id in results for paper_id in ids):
+            return [results[paper_id] for paper_id in ids]
+        middle = len(papers) // 2
+        return self.enrich_batch(
+            papers[:middle], translate_lang, tldr_lang, max_words, translate, tldr
+        ) + self.enrich_batch(papers[middle:], translate_lang, tldr_lang, max_words, translate, tldr)
+
+    def _enrich_one(
+        self,
+        paper: Dict[str, Any],
+        translate_lang: str,
+        tldr_lang: str,
+        max_words: int,
+        translate: bool,
+        tldr: bool,
+    ) -> Dict[str, str]:
+        title = paper.get("title") or ""
+        abstract = paper.get("abstract") or ""
+        if translate and tldr:
+            return self.enrich(title, abstract, translate_lang=translate_lang, tldr_lang=tldr_lang, max_words=max_words)
+        if translate:
+            return {"abstract_zh": self.translate(abstract, target_lang=translate_lang)}
+        return {"tldr": self.summarize(title=title, abstract=abstract, target_lang=tldr_lang, max_words=max_words)}
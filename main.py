@@ -1,27 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import threading
 from typing import Dict, List
 
 from arxiv_fetcher import fetch_daily_arxiv
 from config_utils import has_config_value, load_config, validate_main_config
-from daily_digest import generate_daily_digest
+from daily_digest import ImageOptions, generate_daily_digest
 from feishu import build_post_content, post_to_feishu
+from figure_cache import FigureCache
 from feishu_docs import FeishuDocsClient
 from wechat import post_papers_separately
-from llm_utils import LLMScorer
+from llm_batch import batch_enrich
+from llm_cache import LLMResponseCache
+from llm_limiter import LLMRateLimiter, TokenBudgetExceeded
+from llm_metrics import LLMMetrics
+from llm_rerank import RerankScoreStore, build_profile_text, llm_rerank
+from llm_utils import LLMScorer, pack_batches
 from naming import build_daily_doc_title
-from similarity import rerank_by_embedding
+from similarity import model_load_seconds, rerank_by_embedding, warm_up
 from zotero_client import fetch_papers
 
 
-def enrich_with_llm(papers: List[Dict], scorer: LLMScorer, query: Dict[str, str]) -> List[Dict]:
+def enrich_with_llm(
+    papers: List[Dict],
+    scorer: LLMScorer,
+    query: Dict[str, str],
+    concurrency: int = 1,
+    batch_size: int = 1,
+    batch_max_tokens: int = 6000,
+) -> List[Dict]:
+    """
+    Add `abstract_zh` / `tldr` to each paper, enriching up to `concurrency` requests at once.
+
+    With `batch_size` > 1, papers are packed into multi-paper requests of at most `batch_size`
+    papers and about `batch_max_tokens` input tokens. Output order matches `papers`; a failed
+    LLM call only blanks that paper's field. Once the scorer's token budget is spent, the
+    remaining papers are returned without enrichment.
+    """
     translate_abstract = bool(query.get("translate_abstract", True))
     include_abstract = bool(query.get("include_abstract", True))
     include_tldr = bool(query.get("include_tldr", True))
     tldr_lang = query.get("tldr_language", "Chinese")
     tldr_max_words = int(query.get("tldr_max_words", 80))
-    results: List[Dict] = []
-    for paper in papers:
+
+    def enrich(paper: Dict) -> Dict:
+        try:
+            return enrich_paper(paper)
+        except TokenBudgetExceeded:
+            return {**paper}
+
+    def enrich_paper(paper: Dict) -> Dict:
         enriched = {**paper}
+        if include_abstract and translate_abstract and include_tldr and paper.get("abstract"):
+            # One JSON-mode call for both fields; falls back to separate calls on bad output.
+            enriched.update(
+                scorer.enrich(
+                    title=paper.get("title", ""),
+                    abstract=paper["abstract"],
+                    translate_lang="Chinese",
+                    tldr_lang=tldr_lang,
+                    max_words=tldr_max_words,
+                )
+            )
+            return enriched
         if include_abstract and translate_abstract and paper.get("abstract"):
             enriched["abstract_zh"] = scorer.translate(paper["abstract"], target_lang="Chinese")
         if include_tldr:
@@ -31,8 +72,93 @@ def enrich_with_llm(papers: List[Dict], scorer: LLMScorer, query: Dict[str, str]
                 target_lang=tldr_lang,
                 max_words=tldr_max_words,
             )
-        results.append(enriched)
-    return results
+        return enriched
+
+    if batch_size > 1:
+        translate = include_abstract and translate_abstract
+        with_abstract = [paper for paper in papers if paper.get("abstract")]
+        batches = pack_batches(with_abstract, batch_size, batch_max_tokens)
+
+        def enrich_batch(batch: List[Dict]) -> List[Dict[str, str]]:
+            try:
+                return scorer.enrich_batch(
+                    batch,
+                    translate_lang="Chinese",
+                    tldr_lang=tldr_lang,
+                    max_words=tldr_max_words,
+                    translate=translate,
+                    tldr=include_tldr,
+                )
+            except TokenBudgetExceeded:
+                return [{} for _ in batch]
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches) or 1))) as pool:
+            batch_results = list(pool.map(enrich_batch, batches))
+        fields_by_paper = {
+            id(paper): fields for batch, results in zip(batches, batch_results) for paper, fields in zip(batch, results)
+        }
+        blank = {name: "" for name, wanted in (("tldr", include_tldr), ("abstract_zh", translate)) if wanted}
+        return [{**paper, **blank, **fields_by_paper.get(id(paper), {})} for paper in papers]
+
+    if concurrency <= 1 or len(papers) <= 1:
+        return [enrich(paper) for paper in papers]
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(papers))) as pool:
+        return list(pool.map(enrich, papers))
+
+
+def enrich_with_batch_api(
+    papers: List[Dict],
+    scorer: LLMScorer,
+    query: Dict[str, str],
+    work_dir: str,
+    poll_seconds: float = 30.0,
+    timeout_seconds: float = 24 * 3600,
+    concurrency: int = 1,
+) -> List[Dict]:
+    """
+    Like `enrich_with_llm`, but send the TLDR/translation requests through the provider's batch
+    endpoint and wait for it. Papers the batch could not answer are enriched synchronously.
+    """
+    translate = bool(query.get("include_abstract", True)) and bool(query.get("translate_abstract", True))
+    include_tldr = bool(query.get("include_tldr", True))
+    if not translate and not include_tldr:
+        return [{**paper} for paper in papers]
+    results = batch_enrich(
+        papers,
+        scorer,
+        work_dir=work_dir,
+        translate_lang="Chinese",
+        tldr_lang=query.get("tldr_language", "Chinese"),
+        max_words=int(query.get("tldr_max_words", 80)),
+        poll_seconds=poll_seconds,
+        timeout_seconds=timeout_seconds,
+        translate=translate,
+        tldr=include_tldr,
+    )
+    leftovers = [paper for paper, fields in zip(papers, results) if fields is None]
+    unanswered = sum(1 for paper in leftovers if paper.get("abstract"))
+    if unanswered:
+        print(f"Enriching {unanswered} papers synchronously after the batch.")
+    finished = iter(enrich_with_llm(leftovers, scorer, query, concurrency=concurrency))
+    enriched: List[Dict] = []
+    for paper, fields in zip(papers, results):
+        if fields is None:
+            enriched.append(next(finished))
+            continue
+        enriched.append({**paper, **fields})
+    return enriched
+
+
+def _warm_up_in_background(model_name: str, backend: str, onnx_dir: str) -> threading.Thread:
+    def run() -> None:
+        try:
+            warm_up([model_name], backend=backend, onnx_dir=onnx_dir)
+        except Exception as exc:
+            print(f"Embedding model warm-up failed ({exc}); rerank will retry or fall back.")
+
+    thread = threading.Thread(target=run, name="embedding-warm-up", daemon=True)
+    thread.start()
+    return thread
 
 
 def main():
@@ -54,9 +180,16 @@ def main():
         library_type=config["zotero"]["library_type"],
         item_types=config["zotero"]["item_types"],
         max_items=max_items,
+        snapshot_path=config["zotero"].get("snapshot_path") or None,
+        workers=int(config["zotero"].get("fetch_workers", 4)),
     )
     print(f"Fetched {len(zotero_papers)} papers with abstracts from Zotero.")
 
+    # Load the embedding model while waiting on arXiv so rerank does not pay for it.
+    embedding_backend = str(config["embedding"].get("backend", "torch")).lower()
+    onnx_dir = config["embedding"].get("onnx_dir") or ".cache/onnx"
+    warm_up_thread = _warm_up_in_background(config["embedding"]["model"], embedding_backend, onnx_dir)
+
     print("Fetching arXiv daily papers...")
     arxiv_papers = fetch_daily_arxiv(
         arxiv_query=config["arxiv"]["query"],
@@ -74,29 +207,138 @@ def main():
         print("No new arXiv papers. Exit.")
         return
 
+    llm_cache = None
+    if config["llm"].get("cache_path"):
+        llm_cache = LLMResponseCache(
+            config["llm"]["cache_path"],
+            max_entries=int(config["llm"].get("cache_max_entries", 5000)),
+            ttl_seconds=float(config["llm"].get("cache_ttl_days", 14)) * 86400,
+        )
+    limiter = LLMRateLimiter(
+        requests_per_minute=float(config["llm"].get("requests_per_minute", 0)),
+        tokens_per_minute=float(config["llm"].get("tokens_per_minute", 0)),
+        token_budget=int(config["llm"].get("token_budget", 0)),
+        max_retries=int(config["llm"].get("max_retries", 4)),
+    )
+    scorer = LLMScorer(
+        api_key=config["llm"]["api_key"],
+        base_url=config["llm"]["base_url"],
+        model=config["llm"]["model"],
+        temperature=float(config["llm"].get("temperature", 0.0)),
+        cache=llm_cache,
+        limiter=limiter,
+        max_abstract_tokens=int(config["llm"].get("max_abstract_tokens", 600)),
+        metrics=LLMMetrics(
+            input_price=float(config["llm"].get("input_price", 0.0)),
+            output_price=float(config["llm"].get("output_price", 0.0)),
+            cached_input_price=float(config["llm"]["cached_input_price"])
+            if config["llm"].get("cached_input_price") is not None
+            else None,
+        ),
+    )
+
     print("Reranking by Zotero similarity...")
+    warm_up_thread.join()
+    top_k = int(config["query"].get("max_results", 5))
+    use_llm_rerank = bool(config["llm"].get("rerank", False))
     ranked = rerank_by_embedding(
         candidates=arxiv_papers,
         corpus=zotero_papers,
         model_name=config["embedding"]["model"],
-        top_k=int(config["query"].get("max_results", 5)),
+        top_k=max(top_k, int(config["llm"].get("rerank_shortlist", 20))) if use_llm_rerank else top_k,
         max_corpus=int(config["query"].get("max_corpus", 400)) if config["query"].get("max_corpus") else None,
+        cache_dir=config["embedding"].get("cache_dir") or None,
+        aggregation=str(config["embedding"].get("aggregation", "mean")).lower(),
+        block_size=int(config["embedding"].get("block_size", 2048)),
+        neighbors=int(config["embedding"].get("neighbors", 5)),
+        temperature=float(config["embedding"].get("softmax_temperature", 0.05)),
+        ann=str(config["embedding"].get("ann") or "").lower(),
+        ann_nprobe=int(config["embedding"].get("ann_nprobe", 8)),
+        ann_min_corpus=int(config["embedding"].get("ann_min_corpus", 5000)),
+        profile_clusters=int(config["embedding"].get("profile_clusters", 8)),
+        backend=embedding_backend,
+        onnx_dir=onnx_dir,
+        max_tokens=int(config["embedding"].get("max_tokens", 256) or 0),
+        batch_size=int(config["embedding"].get("batch_size", 32)),
+        include_title=bool(config["embedding"].get("include_title", False)),
     )
     print(f"Top {len(ranked)} matched papers after rerank.")
+    for model_name, seconds in model_load_seconds().items():
+        print(f"Embedding model {model_name} load time: {seconds:.1f}s")
+    if use_llm_rerank and ranked:
+        profile = config["llm"].get("rerank_profile") or build_profile_text(zotero_papers)
+        if not profile:
+            print("No interest profile for the LLM rerank (empty Zotero library); keeping embedding order.")
+            ranked = ranked[:top_k]
+        else:
+            print(f"Reranking {len(ranked)} shortlisted papers with the LLM...")
+            ranked = llm_rerank(
+                ranked,
+                scorer,
+                profile=profile,
+                top_k=top_k,
+                weight=float(config["llm"].get("rerank_weight", 0.5)),
+                concurrency=int(config["llm"].get("concurrency", 4)),
+                confident_score=float(config["llm"].get("rerank_confident_score", 0.8)),
+                store=RerankScoreStore(
+                    config["llm"].get("rerank_cache_path") or None,
+                    max_entries=int(config["llm"].get("cache_max_entries", 5000)),
+                    ttl_seconds=float(config["llm"].get("cache_ttl_days", 14)) * 86400,
+                ),
+            )
     if not ranked:
         print("No matching papers after rerank.")
         return
 
-    scorer = LLMScorer(
-        api_key=config["llm"]["api_key"],
-        base_url=config["llm"]["base_url"],
-        model=config["llm"]["model"],
-        temperature=float(config["llm"].get("temperature", 0.0)),
-    )
-
-    matches = enrich_with_llm(ranked, scorer, config["query"])
+    if str(config["llm"].get("mode", "sync")).lower() == "batch":
+        matches = enrich_with_batch_api(
+            ranked,
+            scorer,
+            config["query"],
+            work_dir=config["llm"].get("batch_dir") or ".cache/llm_batches",
+            poll_seconds=float(config["llm"].get("batch_poll_seconds", 30)),
+            timeout_seconds=float(config["llm"].get("batch_timeout_minutes", 300)) * 60,
+            concurrency=int(config["llm"].get("concurrency", 4)),
+        )
+    else:
+        matches = enrich_with_llm(
+            ranked,
+            scorer,
+            config["query"],
+            concurrency=int(config["llm"].get("concurrency", 4)),
+            batch_size=int(config["llm"].get("batch_size", 8)),
+            batch_max_tokens=int(config["llm"].get("batch_max_tokens", 6000)),
+        )
     print(f"Enriched {len(matches)} matched papers.")
+    for method, stats in scorer.metrics.summary().items():
+        cached_share = stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        latency = (
+            f"p50 {stats['latency_p50']:.2f}s, p95 {stats['latency_p95']:.2f}s"
+            if stats["latency_p50"] is not None
+            else "no live calls"
+        )
+        print(
+            f"LLM {method}: {stats['calls']} calls {stats['outcomes']}, {latency}, "
+            f"{stats['prompt_tokens']} prompt tokens ({cached_share:.0%} cached), "
+            f"{stats['completion_tokens']} completion, ~{stats['estimated_cost']:.4f} est. cost"
+        )
+    stats = limiter.stats()
+    print(
+        f"LLM limiter: {stats['tokens_used']} tokens, {stats['retries']} retries, "
+        f"{stats['failures']} failed calls, {stats['throttled_seconds']:.1f}s throttled."
+    )
+    if stats["budget_exhausted"]:
+        print(f"LLM token budget ({limiter.token_budget}) exhausted; remaining papers were not enriched.")
+    if llm_cache is not None:
+        stats = scorer.cache_stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries stored.")
 
+    figure_cache = None
+    if config["output"].get("figure_cache_dir"):
+        figure_cache = FigureCache(
+            config["output"]["figure_cache_dir"],
+            max_bytes=int(float(config["output"].get("figure_cache_max_mb", 200)) * 1024 * 1024),
+        )
     digest = generate_daily_digest(
         title=daily_title,
         query=config["arxiv"]["query"],
@@ -105,8 +347,33 @@ def main():
         include_figures=bool(config["output"].get("include_figures", True)),
         figure_pages=int(config["output"].get("figure_pages", 3)),
         generated_at=generated_at,
+        figure_download_workers=int(config["output"].get("figure_download_workers", 4)),
+        figure_per_host=int(config["output"].get("figure_per_host", 2)),
+        figure_extract_workers=int(config["output"].get("figure_extract_workers", 0)),
+        figure_cache=figure_cache,
+        max_pdf_mb=float(config["output"].get("max_pdf_mb", 40)),
+        pdf_cache_dir=config["output"].get("pdf_cache_dir") or None,
+        pdf_cache_max_mb=float(config["output"].get("pdf_cache_max_mb", 500)),
+        image_options=ImageOptions(
+            max_width=int(config["output"].get("figure_max_width", 1200)),
+            format=str(config["output"].get("figure_format", "auto")).lower(),
+            quality=int(config["output"].get("figure_quality", 85)),
+            preview_dpi=int(config["output"].get("preview_dpi", 100)),
+            preview_width=int(config["output"].get("preview_width", 0)),
+            preview_crop=bool(config["output"].get("preview_crop", True)),
+        ),
     )
+    downloaded = [paper["pdf_bytes"] for paper in digest.papers if "pdf_bytes" in paper]
+    if downloaded:
+        print(f"Downloaded {len(downloaded)} PDFs, {sum(downloaded) / 1024 / 1024:.1f} MB in total.")
+    if figure_cache is not None:
+        print(f"Figure cache: {figure_cache.hits} hits, {figure_cache.misses} misses.")
     print(f"Markdown digest written to {digest.markdown_path}")
+    report_path = scorer.metrics.write_report(
+        digest.markdown_path.parent / "llm_report.json",
+        extra={"limiter": limiter.stats(), "cache": scorer.cache_stats()},
+    )
+    print(f"LLM call report written to {report_path}")
 
     doc_url = ""
     doc_publish_error = ""
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import re
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+_NON_ALNUM_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+_QUANTIZED_NAME = "model.int8.onnx"
+_META_NAME = "meta.json"
+_POOLING_MODES = ("cls", "max", "mean")
+
+
+def _export_dir(root: str, model_name: str) -> Path:
+    return Path(root) / (_NON_ALNUM_RE.sub("_", model_name).strip("_") or "model")
+
+
+def _pooling_mode(module) -> str:
+    """
+    Pooling mode of a sentence-transformers `Pooling` module, from its saved config: newer
+    releases store `pooling_mode`, older ones one `pooling_mode_*_token(s)` flag per mode.
+    """
+    config = module.get_config_dict()
+    mode = config.get("pooling_mode")
+    if isinstance(mode, (list, tuple)):
+        mode = mode[0] if len(mode) == 1 else None
+    if mode is None:
+        flags = {"cls": "pooling_mode_cls_token", "max": "pooling_mode_max_tokens", "mean": "pooling_mode_mean_tokens"}
+        enabled = [name for name, key in flags.items() if config.get(key)]
+        mode = enabled[0] if len(enabled) == 1 else None
+    if mode not in _POOLING_MODES:
+        raise ValueError(f"Unsupported pooling for ONNX export: {config} (expected one of {list(_POOLING_MODES)})")
+    return mode
+
+
+def _checked_pooling(st_model) -> str:
+    """
+    Pooling mode of a `Transformer -> Pooling -> [Normalize]` pipeline. Anything else (a Dense
+    projection, LayerNorm, ...) would change the embeddings after the exported transformer, so
+    it raises and the caller stays on torch.
+    """
+    from sentence_transformers.models import Normalize, Pooling, Transformer
+
+    modules = list(st_model)
+    supported = (
+        len(modules) >= 2
+        and isinstance(modules[0], Transformer)
+        and isinstance(modules[1], Pooling)
+        and all(isinstance(module, Normalize) for module in modules[2:])
+    )
+    if not supported:
+        names = " -> ".join(type(module).__name__ for module in modules)
+        raise ValueError(f"ONNX export supports Transformer -> Pooling -> [Normalize] pipelines only, not {names}")
+    return _pooling_mode(modules[1])
+
+
+def export_quantized(model_name: str, root: str) -> Path:
+    """
+    Export the SentenceTransformer's transformer to ONNX once and quantize its weights to int8.
+
+    Reuses an existing export under `root/<model>/`. The tokenizer, pooling mode and max
+    sequence length are saved alongside so encoding does not need torch at all.
+    """
+    directory = _export_dir(root, model_name)
+    if (directory / _QUANTIZED_NAME).exists() and (directory / _META_NAME).exists():
+        # Exports from before the pipeline check record no modules; redo those.
+        if "modules" in json.loads((directory / _META_NAME).read_text(encoding="utf-8")):
+            return directory
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    start = time.perf_counter()
+    st_model = SentenceTransformer(model_name, device="cpu")
+    pooling = _checked_pooling(st_model)
+    directory.mkdir(parents=True, exist_ok=True)
+    transformer = st_model[0]
+    hf_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(str(directory))
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes: Dict[str, Dict[int, str]] = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    fp32_path = directory / "model.onnx"
+
+    class KeywordInputs(torch.nn.Module):
+        def __init__(self) -> None:
+            super().__init__()
+            self.model = hf_model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    with torch.no_grad():
+        # The TorchScript exporter (dynamo=False) does not need onnxscript. It passes inputs
+        # positionally, so the wrapper maps them back to keywords for the HF forward().
+        torch.onnx.export(
+            KeywordInputs(),
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False,
+        )
+    quantize_dynamic(str(fp32_path), str(directory / _QUANTIZED_NAME), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+
+    meta = {
+        "model": model_name,
+        "pooling": pooling,
+        "max_seq_length": int(st_model.get_max_seq_length() or 512),
+        "input_names": input_names,
+        "modules": [type(module).__name__ for module in st_model],
+    }
+    (directory / _META_NAME).write_text(json.dumps(meta), encoding="utf-8")
+    print(f"Exported int8 ONNX model for {model_name} in {time.perf_counter() - start:.1f}s.")
+    return directory
+
+
+class OnnxEncoder:
+    """
+    CPU sentence encoder running a dynamically quantized ONNX export through onnxruntime.
+    """
+
+    def __init__(self, model_name: str, root: str, threads: Optional[int] = None) -> None:
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        directory = export_quantized(model_name, root)
+        self.meta = json.loads((directory / _META_NAME).read_text(encoding="utf-8"))
+        self.tokenizer = AutoTokenizer.from_pretrained(str(directory))
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(
+            str(directory / _QUANTIZED_NAME),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names: List[str] = self.meta["input_names"]
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        if self.meta.get("pooling") == "cls":
+            return hidden[:, 0]
+        if self.meta.get("pooling") == "max":
+            return np.where(attention_mask[..., None] > 0, hidden, -np.inf).max(axis=1)
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32, max_length: Optional[int] = None) -> np.ndarray:
+        outputs: List[np.ndarray] = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(
+                list(texts[start : start + batch_size]),
+                padding=True,
+                truncation=True,
+                max_length=min(max_length or self.meta["max_seq_length"], self.meta["max_seq_length"]),
+                return_tensors="np",
+            )
+            feed = {name: batch[name].astype(np.int64) for name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+            outputs.append(self._pool(hidden, batch["attention_mask"]))
+        if not outputs:
+            return np.zeros((0, 0), dtype=np.float32)
+        embeddings = np.concatenate(outputs).astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
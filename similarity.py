@@ -1,61 +1,403 @@
 from __future__ import annotations
 
 from collections import Counter
-from math import sqrt
 import re
-from typing import Dict, List, Sequence
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 import numpy as np
 
+from aggregation import AGGREGATORS, aggregate_embeddings, aggregate_matrix
+from ann_index import open_index
+from embedding_store import EmbeddingStore, text_hash
+from interest_profile import build_profile
+
 
 _TOKEN_RE = re.compile(r"[A-Za-z0-9_]+")
+PROFILE_AGGREGATION = "cluster"
+EMBEDDING_BACKENDS = ("torch", "onnx")
+DEFAULT_ONNX_DIR = ".cache/onnx"
+
+# Process-wide model registry: each SentenceTransformer is loaded once and reused.
+_MODELS: Dict[str, Any] = {}
+_MODEL_LOAD_SECONDS: Dict[str, float] = {}
+_MODELS_LOCK = threading.Lock()
+# SentenceTransformer only truncates via its shared `max_seq_length`, so per-call limits are
+# applied under this lock and restored afterwards.
+_SEQ_LENGTH_LOCK = threading.Lock()
 
 
 def _tokenize(text: str) -> List[str]:
     return _TOKEN_RE.findall((text or "").lower())
 
 
-def _bow_cosine_scores(candidates: Sequence[str], corpus: Sequence[str]) -> np.ndarray:
-    corpus_counters = [Counter(_tokenize(text)) for text in corpus]
-    cand_counters = [Counter(_tokenize(text)) for text in candidates]
+def _csr_term_counts(
+    docs: Sequence[str],
+    vocab: Dict[str, int],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Tokenize `docs` into CSR arrays (indptr, indices, data) of raw term counts, growing `vocab`.
+    """
+    indptr = [0]
+    indices: List[int] = []
+    data: List[float] = []
+    for text in docs:
+        for token, count in Counter(_tokenize(text)).items():
+            column = vocab.get(token)
+            if column is None:
+                column = vocab[token] = len(vocab)
+            indices.append(column)
+            data.append(count)
+        indptr.append(len(indices))
+    return (
+        np.asarray(indptr, dtype=np.int64),
+        np.asarray(indices, dtype=np.int64),
+        np.asarray(data, dtype=np.float64),
+    )
+
+
+def _csr_row_norms(indptr: np.ndarray, data: np.ndarray) -> np.ndarray:
+    sums = np.zeros(len(indptr) - 1, dtype=np.float64)
+    rows = np.repeat(np.arange(len(sums)), np.diff(indptr))
+    np.add.at(sums, rows, data * data)
+    norms = np.sqrt(sums)
+    norms[norms == 0] = 1.0
+    return norms
 
-    if not corpus_counters or not cand_counters:
-        return np.zeros((len(candidates), len(corpus)), dtype=float)
 
-    corpus_norms = [sqrt(sum(v * v for v in counter.values())) or 1.0 for counter in corpus_counters]
-    cand_norms = [sqrt(sum(v * v for v in counter.values())) or 1.0 for counter in cand_counters]
+def _bow_cosine_scores(
+    candidates: Sequence[str],
+    corpus: Sequence[str],
+    tfidf: bool = False,
+    block_size: int = 1024,
+) -> np.ndarray:
+    """
+    Bag-of-words cosine similarity, shape `(len(candidates), len(corpus))`.
 
+    Both sides share one vocabulary and are stored as CSR term matrices. Candidates are
+    densified over the columns they actually use, and the corpus is multiplied against
+    that dense block `block_size` rows at a time. With `tfidf`, counts are weighted by
+    smoothed corpus IDF before normalization.
+    """
     scores = np.zeros((len(candidates), len(corpus)), dtype=float)
-    for i, cand_counter in enumerate(cand_counters):
-        if not cand_counter:
-            continue
-        for j, corpus_counter in enumerate(corpus_counters):
-            if not corpus_counter:
-                continue
-            common = set(cand_counter) & set(corpus_counter)
-            if not common:
-                continue
-            dot = sum(cand_counter[token] * corpus_counter[token] for token in common)
-            scores[i, j] = dot / (cand_norms[i] * corpus_norms[j])
+    if not candidates or not corpus:
+        return scores
+
+    vocab: Dict[str, int] = {}
+    cand_indptr, cand_indices, cand_data = _csr_term_counts(candidates, vocab)
+    corpus_indptr, corpus_indices, corpus_data = _csr_term_counts(corpus, vocab)
+    if not len(cand_indices) or not len(corpus_indices):
+        return scores
+
+    if tfidf:
+        doc_freq = np.bincount(corpus_indices, minlength=len(vocab)).astype(np.float64)
+        idf = np.log((1.0 + len(corpus)) / (1.0 + doc_freq)) + 1.0
+        cand_data = cand_data * idf[cand_indices]
+        corpus_data = corpus_data * idf[corpus_indices]
+
+    cand_data = cand_data / np.repeat(_csr_row_norms(cand_indptr, cand_data), np.diff(cand_indptr))
+    corpus_data = corpus_data / np.repeat(_csr_row_norms(corpus_indptr, corpus_data), np.diff(corpus_indptr))
+
+    # Only terms that occur in some candidate can contribute to a dot product.
+    used_columns = np.unique(cand_indices)
+    column_map = np.full(len(vocab), -1, dtype=np.int64)
+    column_map[used_columns] = np.arange(len(used_columns))
+
+    cand_dense = np.zeros((len(candidates), len(used_columns)), dtype=np.float64)
+    cand_rows = np.repeat(np.arange(len(candidates)), np.diff(cand_indptr))
+    cand_dense[cand_rows, column_map[cand_indices]] = cand_data
+
+    corpus_rows = np.repeat(np.arange(len(corpus)), np.diff(corpus_indptr))
+    corpus_columns = column_map[corpus_indices]
+    keep = corpus_columns >= 0
+    corpus_rows, corpus_columns, corpus_data = corpus_rows[keep], corpus_columns[keep], corpus_data[keep]
+    row_bounds = np.searchsorted(corpus_rows, np.arange(0, len(corpus) + block_size, block_size))
+
+    for block_idx, start in enumerate(range(0, len(corpus), block_size)):
+        stop = min(start + block_size, len(corpus))
+        lo, hi = row_bounds[block_idx], row_bounds[block_idx + 1]
+        block = np.zeros((stop - start, len(used_columns)), dtype=np.float64)
+        block[corpus_rows[lo:hi] - start, corpus_columns[lo:hi]] = corpus_data[lo:hi]
+        scores[:, start:stop] = cand_dense @ block.T
     return scores
 
 
-def _encode_texts(model_name: str, texts: Sequence[str]) -> np.ndarray:
-    from sentence_transformers import SentenceTransformer
+def _model_key(model_name: str, backend: str) -> str:
+    return model_name if backend == "torch" else f"{model_name} ({backend})"
+
+
+def load_model(model_name: str, backend: str = "torch", onnx_dir: str = DEFAULT_ONNX_DIR) -> Any:
+    """
+    Return the CPU encoder for `model_name`, loading it on first use only.
+
+    `backend="torch"` is a SentenceTransformer; `backend="onnx"` is an int8-quantized ONNX
+    export run by onnxruntime (exported once into `onnx_dir`).
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend!r} (expected one of {list(EMBEDDING_BACKENDS)})")
+    key = _model_key(model_name, backend)
+    model = _MODELS.get(key)
+    if model is not None:
+        return model
+    with _MODELS_LOCK:
+        model = _MODELS.get(key)
+        if model is None:
+            start = time.perf_counter()
+            if backend == "onnx":
+                from onnx_backend import OnnxEncoder
+
+                model = OnnxEncoder(model_name, onnx_dir)
+            else:
+                from sentence_transformers import SentenceTransformer
+
+                model = SentenceTransformer(model_name, device="cpu")
+            _MODEL_LOAD_SECONDS[key] = time.perf_counter() - start
+            _MODELS[key] = model
+            print(f"Loaded embedding model {key} in {_MODEL_LOAD_SECONDS[key]:.1f}s.")
+    return model
+
+
+def warm_up(model_names: Iterable[str], backend: str = "torch", onnx_dir: str = DEFAULT_ONNX_DIR) -> Dict[str, float]:
+    """
+    Load the given models ahead of time; returns their load times in seconds.
+    """
+    for model_name in model_names:
+        load_model(model_name, backend=backend, onnx_dir=onnx_dir)
+    return model_load_seconds()
+
+
+def model_load_seconds() -> Dict[str, float]:
+    return dict(_MODEL_LOAD_SECONDS)
+
+
+def _length_buckets(lengths: Sequence[int], max_batch_tokens: int, max_batch_size: int) -> List[np.ndarray]:
+    """
+    Group text indices longest-first so each batch holds similar lengths and its padded size
+    (count x longest) stays within `max_batch_tokens`.
+    """
+    order = np.argsort(-np.asarray(lengths), kind="stable")
+    batches: List[np.ndarray] = []
+    start = 0
+    while start < len(order):
+        width = max(int(lengths[order[start]]), 1)
+        size = max(1, min(max_batch_size, max_batch_tokens // width))
+        batches.append(order[start : start + size])
+        start += size
+    return batches
+
+
+def _encode_batch(model: Any, backend: str, texts: List[str], max_length: int) -> np.ndarray:
+    if backend == "onnx":
+        return model.encode(texts, batch_size=len(texts), max_length=max_length)
+    with _SEQ_LENGTH_LOCK:
+        previous = model.max_seq_length
+        model.max_seq_length = max_length
+        try:
+            return model.encode(texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True)
+        finally:
+            model.max_seq_length = previous
+
+
+def _token_lengths(model: Any, backend: str, texts: List[str], max_tokens: int) -> Tuple[List[int], int]:
+    """
+    Token count of each text after truncation, and the truncation limit itself.
+    """
+    if backend == "onnx":
+        limit = int(model.meta["max_seq_length"])
+    else:
+        with _SEQ_LENGTH_LOCK:
+            limit = int(model.max_seq_length or 512)
+    if max_tokens:
+        limit = min(limit, int(max_tokens))
+    lengths = [len(ids) for ids in model.tokenizer(texts, truncation=True, max_length=limit)["input_ids"]]
+    return lengths, limit
+
+
+def _encode_texts(
+    model_name: str,
+    texts: Sequence[str],
+    backend: str = "torch",
+    onnx_dir: str = DEFAULT_ONNX_DIR,
+    max_tokens: int = 0,
+    batch_size: int = 32,
+) -> np.ndarray:
+    """
+    Encode `texts` in length buckets, truncated to `max_tokens` (0 = the model's own limit).
+
+    Texts are sorted by token count, batched so padding stays small, and the embeddings are
+    scattered back into the input order.
+    """
+    model = load_model(model_name, backend=backend, onnx_dir=onnx_dir)
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
 
-    model = SentenceTransformer(model_name, device="cpu")
-    embeddings = model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
+    lengths, limit = _token_lengths(model, backend, texts, max_tokens)
+    batches = _length_buckets(lengths, max_batch_tokens=batch_size * limit, max_batch_size=8 * batch_size)
+    embeddings: Optional[np.ndarray] = None
+    for batch in batches:
+        encoded = np.asarray(_encode_batch(model, backend, [texts[i] for i in batch], limit), dtype=np.float32)
+        if embeddings is None:
+            embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[batch] = encoded
     return embeddings
 
 
-def _similarity_scores(model_name: str, candidate_texts: Sequence[str], corpus_texts: Sequence[str]) -> np.ndarray:
+def _encode_corpus(
+    model_name: str,
+    corpus_texts: Sequence[str],
+    store: Optional[EmbeddingStore] = None,
+    backend: str = "torch",
+    onnx_dir: str = DEFAULT_ONNX_DIR,
+    max_tokens: int = 0,
+    batch_size: int = 32,
+) -> np.ndarray:
+    def encode(texts: Sequence[str]) -> np.ndarray:
+        return _encode_texts(
+            model_name, texts, backend=backend, onnx_dir=onnx_dir, max_tokens=max_tokens, batch_size=batch_size
+        )
+
+    if store is None:
+        return encode(corpus_texts)
+    return store.encode(corpus_texts, encode)
+
+
+def _ann_neighbor_count(aggregation: str, neighbors: int) -> int:
+    if aggregation == "max":
+        return 1
+    if aggregation == "softmax":
+        # Items far below the best neighbours carry negligible softmax weight.
+        return max(neighbors, 64)
+    return neighbors
+
+
+def _ann_scores(
+    store: EmbeddingStore,
+    corpus_texts: Sequence[str],
+    corpus_emb: np.ndarray,
+    cand_emb: np.ndarray,
+    ann: str,
+    nprobe: int,
+    aggregation: str,
+    neighbors: int,
+    temperature: float,
+) -> np.ndarray:
+    k = _ann_neighbor_count(aggregation, neighbors)
+    index = open_index(store.directory, ann, nprobe=nprobe)
+    index.sync([text_hash(text) for text in corpus_texts], corpus_emb)
+    start = time.perf_counter()
+    neighbor_scores = index.query(cand_emb, corpus_emb, k)
+    print(f"ANN ({ann}) top-{k} query for {len(cand_emb)} candidates took {time.perf_counter() - start:.3f}s.")
+    return aggregate_matrix(neighbor_scores, aggregation, top_k=neighbors, temperature=temperature)
+
+
+def _candidate_scores(
+    model_name: str,
+    candidate_texts: Sequence[str],
+    corpus_texts: Sequence[str],
+    cache_dir: Optional[str] = None,
+    aggregation: str = "mean",
+    block_size: int = 2048,
+    neighbors: int = 5,
+    temperature: float = 0.05,
+    ann: str = "",
+    ann_nprobe: int = 8,
+    ann_min_corpus: int = 5000,
+    profile_clusters: int = 8,
+    corpus_papers: Sequence[Dict] = (),
+    backend: str = "torch",
+    onnx_dir: str = DEFAULT_ONNX_DIR,
+    max_tokens: int = 0,
+    batch_size: int = 32,
+) -> Tuple[np.ndarray, Optional[List[str]]]:
+    """
+    Return one score per candidate and, in cluster profile mode, the name of each candidate's winning cluster.
+    """
+    # Backend (int8 vs fp32) and truncation both change the vectors, so each combination gets its own store.
+    store_key = _model_key(model_name, backend) + (f" @{max_tokens}" if max_tokens else "")
+    store = EmbeddingStore(cache_dir, store_key) if cache_dir else None
+    encode_kwargs = dict(backend=backend, onnx_dir=onnx_dir, max_tokens=max_tokens, batch_size=batch_size)
+    if backend != "torch":
+        try:
+            load_model(model_name, backend=backend, onnx_dir=onnx_dir)
+        except Exception as exc:
+            print(f"Embedding backend {backend!r} unavailable ({exc!r}); using the torch backend.")
+            return _candidate_scores(
+                model_name,
+                candidate_texts,
+                corpus_texts,
+                cache_dir=cache_dir,
+                aggregation=aggregation,
+                block_size=block_size,
+                neighbors=neighbors,
+                temperature=temperature,
+                ann=ann,
+                ann_nprobe=ann_nprobe,
+                ann_min_corpus=ann_min_corpus,
+                profile_clusters=profile_clusters,
+                corpus_papers=corpus_papers,
+                backend="torch",
+                onnx_dir=onnx_dir,
+                max_tokens=max_tokens,
+                batch_size=batch_size,
+            )
     try:
-        corpus_emb = _encode_texts(model_name, corpus_texts)
-        cand_emb = _encode_texts(model_name, candidate_texts)
-        return cand_emb @ corpus_emb.T  # cosine because normalized
+        corpus_emb = _encode_corpus(model_name, corpus_texts, store=store, **encode_kwargs)
+        cand_emb = _encode_texts(model_name, candidate_texts, **encode_kwargs)
     except Exception as exc:
         print(f"Embedding rerank unavailable ({exc}); falling back to bag-of-words cosine.")
-        return _bow_cosine_scores(candidate_texts, corpus_texts)
+        scores = _bow_cosine_scores(candidate_texts, corpus_texts)
+        if aggregation == PROFILE_AGGREGATION:
+            aggregation = "mean"
+        return aggregate_matrix(scores, aggregation, top_k=neighbors, temperature=temperature), None
+
+    if aggregation == PROFILE_AGGREGATION:
+        profile = build_profile(
+            [text_hash(text) for text in corpus_texts],
+            corpus_emb,
+            profile_clusters,
+            cache_dir=store.directory if store is not None else None,
+        )
+        scores, winners = profile.score(cand_emb)
+        names = profile.describe(corpus_papers)
+        return scores, [names[winner] for winner in winners.tolist()]
+
+    # The centroid already makes `mean` O(1) per candidate; ANN only helps neighbour aggregations.
+    use_ann = (
+        ann
+        and aggregation != "mean"
+        and len(corpus_texts) >= max(ann_min_corpus, _ann_neighbor_count(aggregation, neighbors))
+    )
+    if use_ann and store is None:
+        print("ANN index needs embedding.cache_dir to persist; using exact scoring.")
+    elif use_ann:
+        try:
+            scores = _ann_scores(
+                store, corpus_texts, corpus_emb, cand_emb, ann, ann_nprobe, aggregation, neighbors, temperature
+            )
+            return scores, None
+        except Exception as exc:
+            print(f"ANN backend {ann!r} failed ({exc!r}); using exact scoring.")
+
+    # Cosine because embeddings are normalized.
+    scores = aggregate_embeddings(
+        cand_emb,
+        corpus_emb,
+        aggregation,
+        block_size=block_size,
+        top_k=neighbors,
+        temperature=temperature,
+    )
+    return scores, None
+
+
+def _paper_text(paper: Dict, include_title: bool = False) -> str:
+    abstract = paper.get("abstract", "") or ""
+    title = (paper.get("title") or "").strip()
+    if include_title and title:
+        return f"{title}. {abstract}"
+    return abstract
 
 
 def rerank_by_embedding(
@@ -64,29 +406,85 @@ def rerank_by_embedding(
     model_name: str,
     top_k: int,
     max_corpus: int = None,
+    cache_dir: Optional[str] = None,
+    aggregation: str = "mean",
+    block_size: int = 2048,
+    neighbors: int = 5,
+    temperature: float = 0.05,
+    ann: str = "",
+    ann_nprobe: int = 8,
+    ann_min_corpus: int = 5000,
+    profile_clusters: int = 8,
+    backend: str = "torch",
+    onnx_dir: str = DEFAULT_ONNX_DIR,
+    max_tokens: int = 0,
+    batch_size: int = 32,
+    include_title: bool = False,
 ) -> List[Dict]:
     """
     Rerank candidate papers by similarity to the Zotero corpus.
 
+    Each candidate's similarities to the corpus are reduced with `aggregation`:
+    `mean` (dot product with the corpus centroid), `max`, `topk_mean` (mean of the
+    `neighbors` closest items) or `softmax` (softmax-weighted with `temperature`).
+    The corpus is streamed in `block_size` rows, so the full matrix is never built.
+
+    With `ann` ("ivf" or "hnsw") and a corpus of at least `ann_min_corpus` items, the
+    neighbour aggregations query an approximate index persisted next to the cached
+    embeddings instead of scanning the whole corpus.
+
+    `aggregation="cluster"` clusters the corpus into `profile_clusters` interest centroids
+    (cached until the corpus changes) and scores each candidate by its closest centroid, so
+    the cost scales with K rather than library size. The winning cluster, named after its
+    most common Zotero collections, is stored in the paper's `interest` field.
+
     Preferred path:
-    - sentence-transformers embeddings on CPU
+    - sentence-transformers embeddings on CPU (`backend="torch"`), or an int8-quantized
+      ONNX export of the same model through onnxruntime (`backend="onnx"`)
+    - corpus embeddings reused from `cache_dir` when set (only new/changed abstracts are encoded)
+
+    Texts are encoded in length buckets of up to `batch_size`-equivalent padded tokens and
+    truncated to `max_tokens`; `include_title` embeds "title. abstract" instead of the abstract.
 
     Fallback path:
     - bag-of-words cosine similarity when the local transformer stack is broken
     """
+    if aggregation not in AGGREGATORS and aggregation != PROFILE_AGGREGATION:
+        expected = sorted([*AGGREGATORS, PROFILE_AGGREGATION])
+        raise ValueError(f"Unknown similarity aggregation: {aggregation!r} (expected one of {expected})")
     if max_corpus:
         corpus = corpus[:max_corpus]
     if not corpus or not candidates:
         return []
 
-    corpus_texts = [paper.get("abstract", "") for paper in corpus]
-    candidate_texts = [paper.get("abstract", "") for paper in candidates]
-    scores = _similarity_scores(model_name, candidate_texts, corpus_texts)
-    avg_scores = scores.mean(axis=1) if scores.size else np.zeros(len(candidates), dtype=float)
+    corpus_texts = [_paper_text(paper, include_title) for paper in corpus]
+    candidate_texts = [_paper_text(paper, include_title) for paper in candidates]
+    scores, interests = _candidate_scores(
+        model_name,
+        candidate_texts,
+        corpus_texts,
+        cache_dir=cache_dir,
+        aggregation=aggregation,
+        block_size=block_size,
+        neighbors=neighbors,
+        temperature=temperature,
+        ann=ann,
+        ann_nprobe=ann_nprobe,
+        ann_min_corpus=ann_min_corpus,
+        profile_clusters=profile_clusters,
+        corpus_papers=corpus,
+        backend=backend,
+        onnx_dir=onnx_dir,
+        max_tokens=max_tokens,
+        batch_size=batch_size,
+    )
 
     ranked: List[Dict] = []
-    for paper, score in zip(candidates, avg_scores):
-        ranked.append({**paper, "score": float(score)})
+    for idx, (paper, score) in enumerate(zip(candidates, scores)):
+        item = {**paper, "score": float(score)}
+        if interests is not None:
+            item["interest"] = interests[idx]
+        ranked.append(item)
 
     ranked.sort(key=lambda item: item["score"], reverse=True)
     return ranked[:top_k]
@@ -70,6 +70,11 @@ def _paper_md(idx: int, paper: Dict[str, str], max_abstract_length: int = 500) -
         score_line += f" | [{link_text}]({link})"
     lines.append(score_line)
     
+    # 兴趣方向（聚类画像模式）
+    interest = (paper.get("interest") or "").strip()
+    if interest:
+        lines.append(f"**兴趣方向:** {interest}")
+
     # 作者
     if author_line:
         lines.append(f"**作者:** {author_line}")
@@ -1,6 +1,12 @@
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
 from pyzotero import zotero
+import requests
+
+from zotero_snapshot import ZoteroSnapshot
 
 
 def _collection_names(client: zotero.Zotero) -> Dict[str, str]:
@@ -8,6 +14,104 @@ def _collection_names(client: zotero.Zotero) -> Dict[str, str]:
     return {item["key"]: item["data"].get("name", "") for item in collections}
 
 
+_PAGE_SIZE = 100
+
+
+class _Backoff:
+    """
+    Library-wide pause shared by all page workers, driven by Zotero's `Backoff` / `Retry-After` headers.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._until = 0.0
+
+    def wait(self) -> None:
+        while True:
+            with self._lock:
+                remaining = self._until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def extend(self, seconds: float) -> None:
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+
+def _header_seconds(response: requests.Response, name: str) -> Optional[float]:
+    value = response.headers.get(name)
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+def _get_items_page(
+    session: requests.Session,
+    url: str,
+    headers: Dict[str, str],
+    params: Dict[str, Any],
+    backoff: _Backoff,
+) -> requests.Response:
+    last_status = None
+    for attempt in range(5):
+        backoff.wait()
+        response = session.get(url, headers=headers, params=params, timeout=30)
+        backoff_seconds = _header_seconds(response, "Backoff")
+        if response.status_code in (429, 503):
+            last_status = response.status_code
+            retry_after = _header_seconds(response, "Retry-After") or backoff_seconds or min(2 ** attempt, 8)
+            backoff.extend(retry_after)
+            continue
+        response.raise_for_status()
+        if backoff_seconds:
+            backoff.extend(backoff_seconds)
+        return response
+    raise RuntimeError(f"Zotero request failed after retries: status={last_status}, params={params}")
+
+
+def fetch_items_concurrently(
+    client: zotero.Zotero,
+    params: Dict[str, Any],
+    on_page: Callable[[int, List[Dict[str, Any]]], None],
+    workers: int = 4,
+) -> int:
+    """
+    Fetch every page of `/items` for `params` from a bounded worker pool.
+
+    `Total-Results` is read from the first page, the remaining offsets are fetched
+    concurrently, and `on_page(start, entries)` is called in the caller's thread as
+    each page arrives (not necessarily in order). Returns the total item count.
+    """
+    url = f"{client.endpoint}/{client.library_type}/{client.library_id}/items"
+    headers = {"Zotero-API-Key": client.api_key, "Zotero-API-Version": "3"}
+    base_params = {**params, "format": "json", "limit": _PAGE_SIZE}
+    backoff = _Backoff()
+    local = threading.local()
+
+    def fetch(start: int) -> List[Dict[str, Any]]:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        return _get_items_page(session, url, headers, {**base_params, "start": start}, backoff).json()
+
+    first = _get_items_page(requests.Session(), url, headers, {**base_params, "start": 0}, backoff)
+    total = int(first.headers.get("Total-Results", 0) or 0)
+    on_page(0, first.json())
+    del first
+
+    offsets = range(_PAGE_SIZE, total, _PAGE_SIZE)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(fetch, start): start for start in offsets}
+        for future in as_completed(futures):
+            # Drop the future as soon as its page is handed off so raw pages do not accumulate.
+            on_page(futures.pop(future), future.result())
+    return total
+
+
 def _build_link(data: Dict[str, Any]) -> Optional[str]:
     if data.get("url"):
         return data["url"]
@@ -16,59 +120,140 @@ def _build_link(data: Dict[str, Any]) -> Optional[str]:
     return None
 
 
+def _normalize_item(data: Dict[str, Any], collection_map: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    abstract = (data.get("abstractNote") or "").strip()
+    title = (data.get("title") or "").strip()
+    if not abstract or not title:
+        return None
+
+    collections = [collection_map.get(key, key) for key in data.get("collections", [])]
+    tags = [t.get("tag") for t in data.get("tags", []) if t.get("tag")]
+    authors = []
+    for creator in data.get("creators", []):
+        name = creator.get("name")
+        if not name:
+            first = creator.get("firstName") or ""
+            last = creator.get("lastName") or ""
+            name = f"{first} {last}".strip()
+        if name:
+            authors.append(name)
+
+    return {
+        "title": title,
+        "abstract": abstract,
+        "collections": collections,
+        "tags": tags,
+        "authors": authors,
+        "link": _build_link(data),
+    }
+
+
+def _normalize_items(
+    items: Iterable[Dict[str, Any]],
+    collection_map: Dict[str, str],
+    max_items: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    papers: List[Dict[str, Any]] = []
+    for data in items:
+        paper = _normalize_item(data, collection_map)
+        if paper is None:
+            continue
+        papers.append(paper)
+        if max_items and len(papers) >= max_items:
+            break
+    return papers
+
+
+def sync_snapshot(
+    client: zotero.Zotero,
+    snapshot: ZoteroSnapshot,
+    library_key: str,
+    item_types: List[str],
+    workers: int = 1,
+) -> None:
+    """
+    Bring the local snapshot up to the current library version.
+
+    The first run (or a changed library/item-type filter) does a full fetch; later runs
+    only request items, collections and deletions newer than the stored version.
+    """
+    since = snapshot.library_version(library_key)
+    # Read the remote version before fetching so edits made mid-sync are picked up next run.
+    remote_version = int(client.last_modified_version())
+    if since is not None and since >= remote_version:
+        print(f"Zotero snapshot up to date (version {since}, {snapshot.count()} items).")
+        return
+
+    if since is None:
+        snapshot.reset()
+        type_filter = " || ".join(item_types)
+        if workers > 1:
+            fetch_items_concurrently(
+                client,
+                {"itemType": type_filter},
+                on_page=lambda _start, entries: snapshot.upsert_items(entries, item_types),
+                workers=workers,
+            )
+        else:
+            snapshot.upsert_items(client.everything(client.items(itemType=type_filter)), item_types)
+        snapshot.upsert_collections(client.everything(client.collections()))
+        print(f"Zotero snapshot initialized at version {remote_version} ({snapshot.count()} items).")
+    else:
+        # Delta fetch is unfiltered so items whose type changed or that were trashed get dropped.
+        items = client.everything(client.items(since=since, includeTrashed=1))
+        collections = client.everything(client.collections(since=since))
+        deleted = client.deleted(since=since) or {}
+        changed = snapshot.upsert_items(items, item_types)
+        snapshot.upsert_collections(collections)
+        snapshot.delete(deleted.get("items", []), deleted.get("collections", []))
+        print(
+            f"Zotero snapshot synced {since} -> {remote_version}: "
+            f"{changed} changed, {len(deleted.get('items', []))} deleted items."
+        )
+    snapshot.commit(library_key, remote_version)
+
+
 def fetch_papers(
     library_id: str,
     api_key: str,
     library_type: str = "user",
     item_types: Optional[List[str]] = None,
     max_items: Optional[int] = None,
+    snapshot_path: Optional[str] = None,
+    workers: int = 4,
 ) -> List[Dict[str, Any]]:
     """
     Fetch papers from Zotero and normalize the fields we need.
+
+    With `snapshot_path`, the library is mirrored into a local SQLite file and only the
+    delta since the last synced version is requested; `max_items` then only limits the result.
+    Full-library fetches use `workers` concurrent page requests (1 keeps the sequential walk).
     """
     if item_types is None:
         item_types = ["conferencePaper", "journalArticle", "preprint"]
 
     client = zotero.Zotero(library_id, library_type, api_key)
+    if snapshot_path:
+        library_key = f"{library_type}:{library_id}:{','.join(sorted(item_types))}"
+        with ZoteroSnapshot(snapshot_path) as snapshot:
+            sync_snapshot(client, snapshot, library_key, item_types, workers=workers)
+            return _normalize_items(snapshot.iter_item_data(), snapshot.collection_names(), max_items)
+
     collection_map = _collection_names(client)
     type_filter = " || ".join(item_types)
     # Sort by latest added first so we match against newest Zotero entries.
     items_kwargs = dict(itemType=type_filter, sort="dateAdded", direction="desc")
     if max_items:
         raw_items = client.items(limit=max_items, **items_kwargs)
-    else:
-        raw_items = client.everything(client.items(**items_kwargs))
-    papers: List[Dict[str, Any]] = []
-
-    for entry in raw_items:
-        data = entry.get("data", {})
-        abstract = (data.get("abstractNote") or "").strip()
-        title = (data.get("title") or "").strip()
-        if not abstract or not title:
-            continue
+    elif workers > 1:
+        pages: Dict[int, List[Dict[str, Any]]] = {}
 
-        collections = [collection_map.get(key, key) for key in data.get("collections", [])]
-        tags = [t.get("tag") for t in data.get("tags", []) if t.get("tag")]
-        authors = []
-        for creator in data.get("creators", []):
-            name = creator.get("name")
-            if not name:
-                first = creator.get("firstName") or ""
-                last = creator.get("lastName") or ""
-                name = f"{first} {last}".strip()
-            if name:
-                authors.append(name)
-
-        paper = {
-            "title": title,
-            "abstract": abstract,
-            "collections": collections,
-            "tags": tags,
-            "authors": authors,
-            "link": _build_link(data),
-        }
-        papers.append(paper)
-        if max_items and len(papers) >= max_items:
-            break
+        def normalize_page(start: int, entries: List[Dict[str, Any]]) -> None:
+            pages[start] = _normalize_items((entry.get("data", {}) for entry in entries), collection_map)
 
-    return papers
+        fetch_items_concurrently(client, items_kwargs, on_page=normalize_page, workers=workers)
+        # Reassemble by page offset to keep the `dateAdded desc` order.
+        return [paper for start in sorted(pages) for paper in pages[start]]
+    else:
+        raw_items = client.everything(client.items(**items_kwargs))
+    return _normalize_items((entry.get("data", {}) for entry in raw_items), collection_map, max_items)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    item_type TEXT NOT NULL,
+    date_added TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_date_added ON items (date_added DESC);
+CREATE TABLE IF NOT EXISTS collections (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+"""
+
+
+class ZoteroSnapshot:
+    """
+    Local SQLite copy of a Zotero library, kept in sync through the `since=<version>` delta API.
+
+    Only raw item `data` dicts are stored; normalization into paper dicts stays in `zotero_client`.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "ZoteroSnapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def library_version(self, library_key: str) -> Optional[int]:
+        """
+        Return the synced library version, or None when the snapshot belongs to another library/filter.
+        """
+        if self._get_meta("library_key") != library_key:
+            return None
+        version = self._get_meta("library_version")
+        return int(version) if version is not None else None
+
+    def reset(self) -> None:
+        self._conn.execute("DELETE FROM items")
+        self._conn.execute("DELETE FROM collections")
+        self._conn.execute("DELETE FROM meta")
+
+    def upsert_items(self, entries: Iterable[Dict[str, Any]], item_types: Sequence[str]) -> int:
+        """
+        Store changed items; items that were trashed or no longer match `item_types` are removed.
+        """
+        wanted = set(item_types)
+        changed = 0
+        for entry in entries:
+            data = entry.get("data", {})
+            key = entry.get("key") or data.get("key")
+            if not key:
+                continue
+            if data.get("deleted") or data.get("itemType") not in wanted:
+                self._conn.execute("DELETE FROM items WHERE key = ?", (key,))
+                continue
+            self._conn.execute(
+                "INSERT INTO items (key, version, item_type, date_added, data) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET version = excluded.version, item_type = excluded.item_type, "
+                "date_added = excluded.date_added, data = excluded.data",
+                (
+                    key,
+                    int(entry.get("version") or data.get("version") or 0),
+                    data.get("itemType", ""),
+                    data.get("dateAdded", ""),
+                    json.dumps(data, ensure_ascii=False),
+                ),
+            )
+            changed += 1
+        return changed
+
+    def upsert_collections(self, entries: Iterable[Dict[str, Any]]) -> None:
+        for entry in entries:
+            key = entry.get("key")
+            if not key:
+                continue
+            self._conn.execute(
+                "INSERT INTO collections (key, name) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET name = excluded.name",
+                (key, entry.get("data", {}).get("name", "")),
+            )
+
+    def delete(self, item_keys: Sequence[str], collection_keys: Sequence[str]) -> None:
+        self._conn.executemany("DELETE FROM items WHERE key = ?", [(key,) for key in item_keys])
+        self._conn.executemany("DELETE FROM collections WHERE key = ?", [(key,) for key in collection_keys])
+
+    def commit(self, library_key: str, library_version: int) -> None:
+        self._set_meta("library_key", library_key)
+        self._set_meta("library_version", str(library_version))
+        self._conn.commit()
+
+    def collection_names(self) -> Dict[str, str]:
+        return {key: name for key, name in self._conn.execute("SELECT key, name FROM collections")}
+
+    def iter_item_data(self, limit: Optional[int] = None) -> Iterable[Dict[str, Any]]:
+        """
+        Yield stored item `data` dicts, newest `dateAdded` first.
+        """
+        sql = "SELECT data FROM items ORDER BY date_added DESC"
+        params: List[Any] = []
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        for (raw,) in self._conn.execute(sql, params):
+            yield json.loads(raw)
+
+    def count(self) -> int:
+        return int(self._conn.execute("SELECT COUNT(*) FROM items").fetchone()[0])